@@ -2,13 +2,31 @@ from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import jwt
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# bcrypt cost factor. Hashes made with any other cost are rehashed on the next
+# successful login, so raising or lowering it takes effect gradually.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Hashing runs in its own threads (bcrypt releases the GIL) so a burst of
+# logins can't stall the event loop. Beyond PASSWORD_HASH_MAX_PENDING queued
+# or running operations, new ones are refused instead of piling up.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -21,6 +39,41 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+        self.rejected = 0
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many login attempts in progress; try again later")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str):
+        """Return (valid, new_hash); new_hash is set when the stored hash's cost is outdated."""
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def stats(self):
+        return {"pending": self._pending, "max_pending": self.max_pending, "rejected": self.rejected}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
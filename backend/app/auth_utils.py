@@ -4,25 +4,93 @@ from jose import JWTError, jwt
 from app.auth import SECRET_KEY, ALGORITHM
 from app.db import db
 from bson import ObjectId
+from bson.errors import InvalidId
+from collections import OrderedDict
+import os
+import time
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/users/login")
 
+# Verified token -> user cache, so authenticated requests skip the users lookup.
+# A deleted user's tokens keep working for up to TOKEN_CACHE_TTL seconds.
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+# Fields handlers need from the current user; never the password hash
+USER_PROJECTION = {"email": 1, "username": 1}
+
+class TokenCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (expires_at, user)
+        self.hits = 0
+        self.misses = 0
+        self.db_lookups = 0
+        self.db_seconds = 0.0
+
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, token: str, user: dict, token_exp: float):
+        # Never outlive the token itself
+        expires_at = min(time.time() + self.ttl, token_exp)
+        self._entries[token] = (expires_at, user)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record_lookup(self, seconds: float):
+        self.db_lookups += 1
+        self.db_seconds += seconds
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        avg_lookup = self.db_seconds / self.db_lookups if self.db_lookups else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "entries": len(self._entries),
+            "avg_db_lookup_ms": round(avg_lookup * 1000, 3),
+            # Each hit skipped one users lookup of roughly average cost
+            "saved_db_ms": round(self.hits * avg_lookup * 1000, 1),
+        }
+
+token_cache = TokenCache(TOKEN_CACHE_TTL, TOKEN_CACHE_MAX_ENTRIES)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+        user_oid = ObjectId(user_id)
+    except (JWTError, InvalidId):
         raise credentials_exception
-        
-    user = db.users.find_one({"_id": ObjectId(user_id)})
+
+    start = time.perf_counter()
+    user = await db.users.find_one({"_id": user_oid}, USER_PROJECTION)
+    token_cache.record_lookup(time.perf_counter() - start)
     if user is None:
         raise credentials_exception
-        
-    return user
\ No newline at end of file
+
+    token_cache.set(token, user, payload.get("exp", float("inf")))
+    return user
@@ -0,0 +1,165 @@
+"""Cache for per-user insight results, keyed by (user_id, endpoint, window).
+
+The backend is picked with INSIGHTS_CACHE_BACKEND:
+- "memory" (default): bounded LRU with a TTL, local to each worker process.
+  Invalidations only reach the worker that handled the write, so other
+  workers can serve results up to INSIGHTS_CACHE_TTL seconds old.
+- "redis": shared by all workers through INSIGHTS_CACHE_URL. Bound its size
+  with Redis' own maxmemory / allkeys-lru settings. Needs the `redis` package.
+- "none": disables caching.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+
+INSIGHTS_CACHE_BACKEND = os.getenv("INSIGHTS_CACHE_BACKEND", "memory")
+INSIGHTS_CACHE_URL = os.getenv("INSIGHTS_CACHE_URL", "redis://localhost:6379/0")
+INSIGHTS_CACHE_TTL = float(os.getenv("INSIGHTS_CACHE_TTL", "60"))
+INSIGHTS_CACHE_MAX_ENTRIES = int(os.getenv("INSIGHTS_CACHE_MAX_ENTRIES", "10000"))
+
+
+class MemoryBackend:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (user_id, field) -> (expires_at, value)
+        self._fields_by_user = {}  # user_id -> set of cached fields
+
+    async def get(self, user_id, field):
+        key = (user_id, field)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, user_id, field, value):
+        key = (user_id, field)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self._fields_by_user.setdefault(user_id, set()).add(field)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate_user(self, user_id):
+        for field in self._fields_by_user.pop(user_id, ()):
+            self._entries.pop((user_id, field), None)
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        fields = self._fields_by_user.get(key[0])
+        if fields is not None:
+            fields.discard(key[1])
+            if not fields:
+                del self._fields_by_user[key[0]]
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """One Redis hash per user, so invalidation is a single DEL."""
+
+    def __init__(self, url: str, ttl: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("INSIGHTS_CACHE_BACKEND=redis requires the 'redis' package")
+        self.ttl = ttl
+        self._redis = redis.from_url(url)
+
+    @staticmethod
+    def _key(user_id):
+        return f"insights:{user_id}"
+
+    async def get(self, user_id, field):
+        raw = await self._redis.hget(self._key(user_id), field)
+        if raw is None:
+            return None
+        stored_at, value = json.loads(raw)
+        # The hash TTL is refreshed on every write, so check each field's age too
+        if stored_at + self.ttl < time.time():
+            return None
+        return value
+
+    async def set(self, user_id, field, value):
+        key = self._key(user_id)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, field, json.dumps([time.time(), value]))
+            pipe.expire(key, int(self.ttl) + 1)
+            await pipe.execute()
+
+    async def invalidate_user(self, user_id):
+        await self._redis.delete(self._key(user_id))
+
+    def size(self):
+        return None
+
+
+class NullBackend:
+    async def get(self, user_id, field):
+        return None
+
+    async def set(self, user_id, field, value):
+        pass
+
+    async def invalidate_user(self, user_id):
+        pass
+
+    def size(self):
+        return 0
+
+
+class InsightsCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _field(endpoint, window):
+        return f"{endpoint}:{window}"
+
+    async def get(self, user_id, endpoint, window):
+        value = await self.backend.get(user_id, self._field(endpoint, window))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, user_id, endpoint, window, value):
+        await self.backend.set(user_id, self._field(endpoint, window), value)
+
+    async def invalidate_user(self, user_id):
+        self.invalidations += 1
+        await self.backend.invalidate_user(user_id)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "invalidations": self.invalidations,
+            "entries": self.backend.size(),
+        }
+
+
+def create_backend(name: str):
+    if name == "memory":
+        return MemoryBackend(INSIGHTS_CACHE_TTL, INSIGHTS_CACHE_MAX_ENTRIES)
+    if name == "redis":
+        return RedisBackend(INSIGHTS_CACHE_URL, INSIGHTS_CACHE_TTL)
+    if name == "none":
+        return NullBackend()
+    raise ValueError(f"Unknown INSIGHTS_CACHE_BACKEND: {name}")
+
+
+insights_cache = InsightsCache(create_backend(INSIGHTS_CACHE_BACKEND))
@@ -0,0 +1,118 @@
+"""Explain every hot route query and fail if any of them scans a whole collection.
+
+Usage:
+    python -m app.check_indexes [--ensure] [--user-id <id>]
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.db import db, ensure_indexes
+from app.rollups import (
+    edge_by_category_pipeline,
+    edge_total_pipeline,
+    rollup_by_category_pipeline,
+    rollup_by_month_pipeline,
+    summary_pipeline,
+)
+from app.routes.transactions import SORT_ORDER, transactions_filter, encode_cursor
+
+
+def plan_stages(explain, stages=None):
+    """Collect every stage name in the winning plans of an explain result."""
+    if stages is None:
+        stages = []
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "rejectedPlans":
+                continue
+            if key == "stage" and isinstance(value, str):
+                stages.append(value)
+            else:
+                plan_stages(value, stages)
+    elif isinstance(explain, list):
+        for item in explain:
+            plan_stages(item, stages)
+    return stages
+
+
+async def explain_find(collection, query, sort=None):
+    cursor = db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    return await cursor.explain()
+
+
+async def explain_aggregate(collection, pipeline):
+    return await db.command(
+        {"explain": {"aggregate": collection, "pipeline": pipeline, "cursor": {}}, "verbosity": "queryPlanner"}
+    )
+
+
+def route_queries(user_id):
+    """The queries issued by each route, keyed by a readable label."""
+    now = datetime.now()
+    cursor = encode_cursor({"date": now, "_id": ObjectId()})
+    return {
+        "GET /api/transactions": explain_find(
+            "transactions", transactions_filter(user_id), SORT_ORDER
+        ),
+        "GET /api/transactions (date range, cursor)": explain_find(
+            "transactions",
+            transactions_filter(user_id, start_date=now - timedelta(days=90), end_date=now, cursor=cursor),
+            SORT_ORDER,
+        ),
+        "GET /api/transactions (category)": explain_find(
+            "transactions", transactions_filter(user_id, category="Food"), SORT_ORDER
+        ),
+        "GET /api/insights/spending-by-category (edge month)": explain_aggregate(
+            "transactions", edge_by_category_pipeline(user_id, now - timedelta(days=30))
+        ),
+        "GET /api/insights/spending-by-category (rollups)": explain_aggregate(
+            "spending_rollups", rollup_by_category_pipeline(user_id, now - timedelta(days=30))
+        ),
+        "GET /api/insights/monthly-trend (edge month)": explain_aggregate(
+            "transactions", edge_total_pipeline(user_id, now - timedelta(days=180))
+        ),
+        "GET /api/insights/monthly-trend (rollups)": explain_aggregate(
+            "spending_rollups", rollup_by_month_pipeline(user_id, now - timedelta(days=180))
+        ),
+        "GET /api/insights/summary": explain_aggregate(
+            "spending_rollups",
+            summary_pipeline(user_id, now - timedelta(days=30), now - timedelta(days=180), 10),
+        ),
+        "GET /api/insights/summary (data version)": explain_find("data_versions", {"_id": user_id}),
+        "ML training reads": explain_find("transactions", {"user_id": user_id}),
+        "ML monthly feature store": explain_find("spending_rollups", {"user_id": user_id, "count": {"$gt": 0}}),
+        "POST /api/users/login, /register": explain_find("users", {"email": "check@example.com"}),
+        "get_current_user": explain_find("users", {"_id": ObjectId()}),
+    }
+
+
+async def main(args):
+    if args.ensure:
+        await ensure_indexes()
+
+    failed = False
+    for label, explain in route_queries(args.user_id).items():
+        stages = plan_stages(await explain)
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        failed = failed or status != "ok"
+        print(f"{status:<9} {label}: {' <- '.join(stages)}")
+
+    if failed:
+        print("\nSome queries scan a whole collection; run with --ensure or check INDEXES in app/db.py")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that every route query uses an index')
+    parser.add_argument('--ensure', action='store_true',
+                      help='Create missing indexes before checking')
+    parser.add_argument('--user-id', default='index-check',
+                      help='User id to plan the queries for (default: index-check)')
+
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,27 @@
+"""Per-user data version, bumped whenever a user's transactions change.
+
+GET /api/insights/summary derives its ETag from it, so a conditional request
+for an unchanged dashboard is answered with 304 after a single _id lookup.
+"""
+from pymongo import UpdateOne
+
+from app.db import db
+
+
+async def get(user_id: str):
+    doc = await db.data_versions.find_one({"_id": user_id})
+    return doc["version"] if doc else 0
+
+
+async def bump(user_ids):
+    if not user_ids:
+        return
+    await db.data_versions.bulk_write(
+        [UpdateOne({"_id": user_id}, {"$inc": {"version": 1}}, upsert=True) for user_id in user_ids],
+        ordered=False,
+    )
+
+
+async def bump_all():
+    """After maintenance that may change any user's derived data."""
+    await db.data_versions.update_many({}, {"$inc": {"version": 1}})
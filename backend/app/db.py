@@ -1,25 +1,131 @@
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
+from pymongo.errors import OperationFailure
 from dotenv import load_dotenv
+from app.metrics import mongo_command_metrics
 import os
-from pymongo.errors import ConnectionFailure
-import sys
+import threading
 
 # Load environment variables
 load_dotenv()
 
-try:
-    # MongoDB connection with options
-    client = MongoClient(
-        os.getenv("MONGODB_URI"),
-        serverSelectionTimeoutMS=5000,  # 5 second timeout
-        connectTimeoutMS=5000,
-        retryWrites=True,
-        w='majority'
-    )
-    # Verify the connection
-    client.admin.command('ping')
-    print("Successfully connected to MongoDB!")
-    db = client.finance_db
-except ConnectionFailure as e:
-    print(f"Failed to connect to MongoDB: {e}")
-    sys.exit(1)
\ No newline at end of file
+# Connection settings (tunable per deployment)
+MONGODB_URI = os.getenv("MONGODB_URI")
+MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "finance_db")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_READ_PREFERENCE = os.getenv("MONGODB_READ_PREFERENCE", "primary")
+MONGODB_WRITE_CONCERN = os.getenv("MONGODB_WRITE_CONCERN", "majority")
+
+def client_options():
+    """Keyword arguments shared by the async and sync clients."""
+    write_concern = MONGODB_WRITE_CONCERN
+    if write_concern.isdigit():
+        write_concern = int(write_concern)
+    return {
+        "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGODB_CONNECT_TIMEOUT_MS,
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGODB_MAX_IDLE_TIME_MS,
+        "readPreference": MONGODB_READ_PREFERENCE,
+        "retryWrites": True,
+        "w": write_concern,
+        # Per-command timings for /metrics
+        "event_listeners": [mongo_command_metrics],
+    }
+
+# One client of each kind per process, created on first use. The async client
+# serves request handlers; the sync one serves ML training/prediction threads,
+# pool processes and command line scripts.
+_client = None
+_sync_client = None
+_lock = threading.Lock()
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = AsyncIOMotorClient(MONGODB_URI, **client_options())
+    return _client
+
+def get_sync_client():
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = MongoClient(MONGODB_URI, **client_options())
+    return _sync_client
+
+class LazyDatabase:
+    """Stands in for a Database, creating the client on first attribute access."""
+
+    def __init__(self, get_client):
+        self._get_client = get_client
+
+    def _database(self):
+        return self._get_client()[MONGODB_DB_NAME]
+
+    def __getattr__(self, name):
+        return getattr(self._database(), name)
+
+    def __getitem__(self, name):
+        return self._database()[name]
+
+db = LazyDatabase(get_client)
+sync_db = LazyDatabase(get_sync_client)
+
+async def connect():
+    """Verify the connection to MongoDB."""
+    await get_client().admin.command('ping')
+
+def close():
+    global _client, _sync_client
+    with _lock:
+        for client in (_client, _sync_client):
+            if client is not None:
+                client.close()
+        _client = _sync_client = None
+
+# Indexes backing the hot queries; created at startup if missing
+INDEXES = {
+    "transactions": [
+        # Per-user listings, date-range insights and keyset pagination on (date, _id)
+        IndexModel(
+            [("user_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+            name="user_date_id",
+        ),
+        # Category-filtered listings
+        IndexModel(
+            [("user_id", ASCENDING), ("category", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+            name="user_category_date_id",
+        ),
+    ],
+    "spending_rollups": [
+        IndexModel(
+            [("user_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING), ("category", ASCENDING)],
+            name="user_month_category_unique",
+            unique=True,
+        ),
+    ],
+    "ml_leases": [
+        # Drops training leases left behind by a worker that died mid-run
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+}
+
+async def ensure_indexes():
+    """Create any missing indexes. Existing indexes are left untouched."""
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            # e.g. duplicate emails blocking the unique index; serve traffic anyway
+            print(f"Failed to create indexes on {collection}: {e}")
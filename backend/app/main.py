@@ -1,15 +1,47 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from contextlib import asynccontextmanager
+from pymongo.errors import ConnectionFailure
 from app.routes import users, transactions, insights
 from app.ml import ml_endpoints
+from app.ml.jobs import training_queue
+from app.auth import password_hasher
+from app import db
+from app.metrics import MetricsMiddleware, metrics_payload
+from app.responses import CompressionMiddleware, FastJSONResponse
+import asyncio
 import os
 import datetime
 
+# Import the ML stack in the background once the server is up
+ML_PREWARM = os.getenv("ML_PREWARM", "false").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Verify the connection before accepting traffic
+    try:
+        await db.connect()
+        print("Successfully connected to MongoDB!")
+    except ConnectionFailure as e:
+        print(f"Failed to connect to MongoDB: {e}")
+        raise
+    await db.ensure_indexes()
+    # Runs once the server is accepting requests; kept on app.state so the task isn't collected
+    app.state.ml_prewarm = asyncio.create_task(ml_endpoints.prewarm_ml()) if ML_PREWARM else None
+    yield
+    if app.state.ml_prewarm is not None:
+        app.state.ml_prewarm.cancel()
+    await training_queue.shutdown()
+    password_hasher.shutdown()
+    db.close()
+
 app = FastAPI(
     title="HisabKitab AI API",
     description="Backend API for HisabKitab AI - Smart Expense Tracking with AI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Configure CORS with environment-based origins
@@ -29,6 +61,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(transactions.router, prefix="/api/transactions", tags=["transactions"])
@@ -55,4 +92,9 @@ async def health_check():
             "timestamp": datetime.datetime.now().isoformat()
         },
         status_code=200
-    )
\ No newline at end of file
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,193 @@
+"""Prometheus metrics, served at GET /metrics.
+
+Recorded on the hot path, each costing a lock and a few additions:
+- HTTP latency per route template and status, plus requests in flight
+- MongoDB command durations, from pymongo's command monitoring
+- model artifact loads, training runs and predictions
+
+Cache hit ratios are read from the caches' own counters only when scraped.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory so /metrics aggregates every worker's histograms. The cache gauges
+then only describe the worker that answered the scrape.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from pymongo import monitoring
+from starlette.routing import Match
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+MONGODB_COMMAND_SECONDS = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command round trips",
+    ["command", "collection"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+MONGODB_COMMAND_FAILURES = Counter(
+    "mongodb_command_failures_total",
+    "MongoDB commands that returned an error",
+    ["command", "collection"],
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "ml_model_load_seconds",
+    "Time to load a model artifact from disk",
+    ["artifact"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+MODEL_TRAIN_SECONDS = Histogram(
+    "ml_train_duration_seconds",
+    "Training run duration, in the pool process",
+    ["model_type", "mode"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+MODEL_PREDICT_SECONDS = Histogram(
+    "ml_predict_duration_seconds",
+    "Prediction latency, including model lookup",
+    ["model_type", "model"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def route_of(self, scope):
+        # Label with the template (/api/transactions/{transaction_id}), never the
+        # raw path, so the number of series stays bounded
+        for route in scope["app"].router.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = self.route_of(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            in_progress.dec()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the async and sync clients send."""
+
+    def __init__(self):
+        self._collections = {}  # (connection, request_id) -> collection name
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""  # database-level commands like ping
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event):
+        return self._collections.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        MONGODB_COMMAND_SECONDS.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        MONGODB_COMMAND_SECONDS.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGODB_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+class CacheCollector:
+    """Exports the in-process caches' counters at scrape time."""
+
+    def describe(self):
+        # Lets the registry learn the names without calling collect() at import
+        return self.families()
+
+    def families(self):
+        return (
+            GaugeMetricFamily("cache_hits", "Cache hits since startup", labels=["cache"]),
+            GaugeMetricFamily("cache_misses", "Cache misses since startup", labels=["cache"]),
+            GaugeMetricFamily("cache_hit_ratio", "Share of lookups served from the cache", labels=["cache"]),
+            GaugeMetricFamily("cache_entries", "Entries currently cached", labels=["cache"]),
+            GaugeMetricFamily("ml_model_registry_resident_bytes", "Private memory of loaded models, excluding shared memory-mapped arrays"),
+        )
+
+    def collect(self):
+        # Imported here: these modules import app.db, which imports this one
+        from app.auth_utils import token_cache
+        from app.cache import insights_cache
+        from app.ml.registry import model_registry
+
+        hits, misses, ratio, entries, resident = self.families()
+
+        registry_stats = model_registry.stats()
+        for name, stats in (
+            ("insights", insights_cache.stats()),
+            ("token", token_cache.stats()),
+            ("model_registry", {**registry_stats, "misses": registry_stats["loads"]}),
+        ):
+            lookups = stats["hits"] + stats["misses"]
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            ratio.add_metric([name], stats["hits"] / lookups if lookups else 0.0)
+            if stats["entries"] is not None:  # None where the size is unknown, e.g. the shared Redis cache
+                entries.add_metric([name], stats["entries"])
+
+        resident.add_metric([], registry_stats["resident_bytes"])
+        yield from (hits, misses, ratio, entries, resident)
+
+
+REGISTRY.register(CacheCollector())
+
+
+def metrics_payload():
+    """Body and content type for GET /metrics."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        registry.register(CacheCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
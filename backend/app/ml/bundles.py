@@ -0,0 +1,265 @@
+"""Versioned single-file model bundles.
+
+Each trained model is stored as one joblib file,
+ML_MODELS_DIR/<model_type>/<user_id>.joblib, holding the fitted model, its
+flattened copy for fast inference (see flat_forest.py), its label encoder,
+the feature columns it expects, the training metadata (watermark, mode,
+timings) and the library versions it was built with.
+
+The fitted model is kept next to its flattened copy because training
+extends it and large batches are predicted with it. It roughly doubles the
+file, and it is the only part that is not shared between workers (see
+registry.py).
+
+Bundles are written to a temporary file and renamed into place, so readers
+never see a half-written model. They are saved uncompressed and loaded with
+mmap_mode='r', which lets every worker share the pages of the flattened
+forest's arrays through the OS page cache. A bundle written by another
+bundle format or scikit-learn release raises StaleBundle, a
+FileNotFoundError, so callers retrain it exactly as if it were missing.
+
+Usage:
+    python -m app.ml.bundles usage
+    python -m app.ml.bundles gc [--dry-run] [--max-age-days N]
+"""
+import argparse
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+
+from app.ml.registry import model_registry
+
+# Bump when the bundle layout changes; older bundles are then retrained
+BUNDLE_FORMAT = 1
+
+# Saved in place of a user id for the models shared by all users (see population.py)
+POPULATION_ID = "population"
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ML_MODELS_DIR = os.getenv("ML_MODELS_DIR", os.path.join(BACKEND_DIR, "app", "ml", "models"))
+
+# Per-artifact files written before bundles existed, in both places they ended up
+LEGACY_DIRS = (ML_MODELS_DIR, os.path.join(BACKEND_DIR, "models"))
+LEGACY_FILE = re.compile(
+    r"^(category|category_encoder|category_meta|next_month|next_month_meta|label_encoder)_[0-9a-f]{24}\.joblib$"
+)
+
+# Temp files older than this are leftovers of a crashed write
+TEMP_MAX_AGE = 3600
+
+
+class StaleBundle(FileNotFoundError):
+    pass
+
+
+def library_versions():
+    import joblib
+    import numpy
+    import sklearn
+
+    return {
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "scikit-learn": sklearn.__version__,
+        "joblib": joblib.__version__,
+    }
+
+
+def bundle_path(model_type: str, user_id: str):
+    return os.path.join(ML_MODELS_DIR, model_type, f"{user_id}.joblib")
+
+
+def save_bundle(model_type: str, user_id: str, *, model, encoder, features, meta):
+    """Atomically write the bundle for (model_type, user_id) and return its path."""
+    import joblib
+    from app.ml.flat_forest import FlatForest
+
+    path = bundle_path(model_type, user_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    bundle = {
+        "format": BUNDLE_FORMAT,
+        "model_type": model_type,
+        "user_id": user_id,
+        "features": list(features),
+        "model": model,
+        "forest": FlatForest.from_estimator(model),
+        "encoder": encoder,
+        "meta": meta,
+        "versions": library_versions(),
+    }
+
+    # Same directory as the target, so the rename can't cross filesystems
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{user_id}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump(bundle, tmp_path)  # uncompressed, so it can be memory-mapped
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    model_registry.invalidate(path)
+    return path
+
+
+def check_bundle(bundle, path):
+    if not isinstance(bundle, dict) or bundle.get("format") != BUNDLE_FORMAT:
+        raise StaleBundle(f"{path} uses an old bundle format")
+    import sklearn
+
+    built_with = bundle["versions"]["scikit-learn"].split(".")[:2]
+    if built_with != sklearn.__version__.split(".")[:2]:
+        raise StaleBundle(f"{path} was built with scikit-learn {bundle['versions']['scikit-learn']}")
+    return bundle
+
+
+def load_bundle(model_type: str, user_id: str):
+    """Shared, read-only bundle from the model registry, for predictions."""
+    path = bundle_path(model_type, user_id)
+    return check_bundle(model_registry.load(path), path)
+
+
+def flat_forest(bundle):
+    """The bundle's FlatForest; bundles saved before it existed are flattened on first use."""
+    if "forest" not in bundle:
+        from app.ml.flat_forest import FlatForest
+
+        bundle["forest"] = FlatForest.from_estimator(bundle["model"])
+    return bundle["forest"]
+
+
+def read_bundle(model_type: str, user_id: str):
+    """Private, writable copy of a bundle, for extending a model in training."""
+    import joblib
+
+    path = bundle_path(model_type, user_id)
+    return check_bundle(joblib.load(path), path)
+
+
+def iter_bundles():
+    """(model_type, user_id, path) of every bundle on disk."""
+    if not os.path.isdir(ML_MODELS_DIR):
+        return
+    for model_type in sorted(os.listdir(ML_MODELS_DIR)):
+        directory = os.path.join(ML_MODELS_DIR, model_type)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".joblib") and not name.startswith("."):
+                yield model_type, name[: -len(".joblib")], os.path.join(directory, name)
+
+
+def iter_legacy_files():
+    for directory in LEGACY_DIRS:
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if LEGACY_FILE.match(name):
+                    yield os.path.join(directory, name)
+
+
+def iter_temp_files():
+    if not os.path.isdir(ML_MODELS_DIR):
+        return
+    for model_type in os.listdir(ML_MODELS_DIR):
+        directory = os.path.join(ML_MODELS_DIR, model_type)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.startswith(".") and name.endswith(".tmp"):
+                    yield os.path.join(directory, name)
+
+
+def disk_usage():
+    """{group: (files, bytes)} for each model type, legacy files and temp files."""
+    usage = {}
+
+    def add(group, path):
+        files, size = usage.get(group, (0, 0))
+        usage[group] = (files + 1, size + os.path.getsize(path))
+
+    for model_type, _, path in iter_bundles():
+        add(model_type, path)
+    for path in iter_legacy_files():
+        add("legacy", path)
+    for path in iter_temp_files():
+        add("temp", path)
+    return usage
+
+
+def stale_paths(max_age_days=None):
+    """(path, reason) for every artifact gc would delete."""
+    from bson import ObjectId
+    from bson.errors import InvalidId
+    from app.db import sync_db
+
+    for path in iter_legacy_files():
+        yield path, "legacy per-artifact file"
+
+    now = time.time()
+    for path in iter_temp_files():
+        if now - os.path.getmtime(path) > TEMP_MAX_AGE:
+            yield path, "abandoned temp file"
+
+    bundles = list(iter_bundles())
+    user_ids = set()
+    for _, user_id, _ in bundles:
+        try:
+            user_ids.add(ObjectId(user_id))
+        except InvalidId:
+            pass
+    existing = {str(u["_id"]) for u in sync_db.users.find({"_id": {"$in": list(user_ids)}}, {"_id": 1})}
+
+    import joblib
+
+    for model_type, user_id, path in bundles:
+        if user_id not in existing and user_id != POPULATION_ID:
+            yield path, "user no longer exists"
+            continue
+        if max_age_days is not None and now - os.path.getmtime(path) > max_age_days * 86400:
+            yield path, f"not retrained in {max_age_days} days"
+            continue
+        try:
+            check_bundle(joblib.load(path, mmap_mode="r"), path)
+        except StaleBundle as e:
+            yield path, str(e)
+        except Exception as e:
+            yield path, f"unreadable: {e}"
+
+
+def print_usage(usage):
+    print(f"{'artifacts':<16} {'files':>8} {'MB':>10}")
+    for group, (files, size) in sorted(usage.items()):
+        print(f"{group:<16} {files:>8} {size / 1e6:>10.2f}")
+    files = sum(files for files, _ in usage.values())
+    size = sum(size for _, size in usage.values())
+    print(f"{'total':<16} {files:>8} {size / 1e6:>10.2f}")
+
+
+def main(args):
+    if args.command == "usage":
+        print_usage(disk_usage())
+        return 0
+
+    freed = 0
+    for path, reason in stale_paths(args.max_age_days):
+        freed += os.path.getsize(path)
+        print(f"{'would remove' if args.dry_run else 'removing'} {path} ({reason})")
+        if not args.dry_run:
+            os.unlink(path)
+            model_registry.invalidate(path)
+    print(f"{'Would free' if args.dry_run else 'Freed'} {freed / 1e6:.2f} MB\n")
+    print_usage(disk_usage())
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect and prune trained model bundles')
+    parser.add_argument('command', choices=['usage', 'gc'],
+                      help='report disk usage, or delete stale artifacts and then report it')
+    parser.add_argument('--dry-run', action='store_true',
+                      help='List what gc would delete without deleting it')
+    parser.add_argument('--max-age-days', type=float, default=None,
+                      help='Also delete bundles not retrained for this many days')
+
+    sys.exit(main(parser.parse_args()))
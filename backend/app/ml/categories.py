@@ -0,0 +1,67 @@
+# Categories with their typical amount ranges and sample descriptions
+CATEGORIES = {
+    'Food': {
+        'range': (100, 2000),
+        'descriptions': [
+            'Lunch at {}', 'Dinner at {}', 'Groceries from {}',
+            'Food delivery from {}', 'Coffee at {}'
+        ],
+        'places': [
+            'Dominos', 'McDonald\'s', 'Subway', 'Local Cafe',
+            'Whole Foods', 'Restaurant', 'Starbucks'
+        ]
+    },
+    'Rent': {
+        'range': (15000, 50000),
+        'descriptions': ['Monthly Rent', 'House Rent', 'Apartment Rent'],
+        'places': []
+    },
+    'Travel': {
+        'range': (500, 5000),
+        'descriptions': [
+            'Uber to {}', 'Cab from {}', 'Bus ticket to {}',
+            'Train ticket to {}', 'Flight to {}'
+        ],
+        'places': [
+            'Airport', 'Office', 'Home', 'Mall', 'Station',
+            'Downtown', 'Market'
+        ]
+    },
+    'Shopping': {
+        'range': (500, 10000),
+        'descriptions': [
+            'Shopping at {}', 'Clothes from {}', 'Electronics from {}',
+            'Purchase at {}', 'Online order from {}'
+        ],
+        'places': [
+            'Amazon', 'Mall', 'Walmart', 'Target', 'Best Buy',
+            'Nike Store', 'Apple Store'
+        ]
+    },
+    'Entertainment': {
+        'range': (200, 3000),
+        'descriptions': [
+            'Movie at {}', 'Gaming subscription {}', 'Concert at {}',
+            'Streaming service {}', 'Entertainment at {}'
+        ],
+        'places': [
+            'Netflix', 'PVR Cinema', 'PlayStation', 'Spotify',
+            'Theme Park', 'Theatre'
+        ]
+    },
+    'Bills': {
+        'range': (1000, 8000),
+        'descriptions': [
+            'Electricity Bill', 'Water Bill', 'Internet Bill',
+            'Phone Bill', 'Gas Bill', 'Insurance Payment'
+        ],
+        'places': []
+    },
+    'Salary': {
+        'range': (50000, 150000),
+        'descriptions': [
+            'Monthly Salary', 'Salary Credit', 'Income'
+        ],
+        'places': []
+    }
+}
@@ -0,0 +1,59 @@
+"""Per-user monthly feature store for next-month forecasting.
+
+The monthly total, sum of squares and count of every user's transactions are
+kept up to date by the rollups written on each transaction insert (see
+app/rollups.py). Folding them into one row per month costs O(months) rather
+than a scan of the user's full transaction history.
+"""
+import numpy as np
+import pandas as pd
+
+FEATURE_COLUMNS = ['total', 'mean', 'std', 'count']
+
+
+def monthly_features(db, user_id):
+    """One row per month with the user's total, mean, std and count, oldest first.
+
+    Matches the pandas groupby it replaces: std is the sample standard deviation
+    and is 0 for months with a single transaction. Also returns the categories
+    the user has used.
+    """
+    months = list(db.spending_rollups.aggregate([
+        {"$match": {"user_id": user_id, "count": {"$gt": 0}}},
+        {
+            "$group": {
+                "_id": {"year": "$year", "month": "$month"},
+                "total": {"$sum": "$total"},
+                "sum_sq": {"$sum": "$sum_sq"},
+                "count": {"$sum": "$count"},
+                "categories": {"$addToSet": "$category"},
+            }
+        },
+        {"$sort": {"_id.year": 1, "_id.month": 1}},
+    ]))
+
+    stats = month_stats(months)
+    stats.insert(0, 'month', [f"{m['_id']['year']:04d}-{m['_id']['month']:02d}" for m in months])
+    categories = sorted({c for m in months for c in m["categories"]})
+    return stats, categories
+
+
+def month_stats(months):
+    """Fold monthly total, sum_sq and count sums into the FEATURE_COLUMNS frame."""
+    total = np.array([m["total"] for m in months], dtype=float)
+    sum_sq = np.array([m["sum_sq"] for m in months], dtype=float)
+    count = np.array([m["count"] for m in months], dtype=float)
+
+    mean = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+    # Sample variance from running sums; clip float noise below zero
+    variance = np.divide(
+        sum_sq - total * mean, count - 1, out=np.zeros_like(total), where=count > 1
+    )
+    std = np.sqrt(np.clip(variance, 0, None))
+
+    return pd.DataFrame({
+        'total': total,
+        'mean': mean,
+        'std': std,
+        'count': count,
+    })
@@ -0,0 +1,113 @@
+"""Random forests flattened into NumPy arrays for fast inference.
+
+scikit-learn's predict and predict_proba validate the input and dispatch
+every tree through joblib. For a single row that overhead is far larger than
+walking the trees. FlatForest concatenates every tree's nodes into a few flat
+arrays: split feature, threshold, children and leaf value. It then walks all
+trees for all rows at once, one vectorised step per level.
+
+Pairs of row and tree that reach a leaf drop out of the walk, so later levels
+only touch the deeper branches. Inputs are cast to float32 before comparing,
+as scikit-learn does, so the same leaves are reached.
+
+Past a few hundred rows scikit-learn's compiled per-tree loop wins again, so
+batch callers hand anything larger than MAX_ROWS to the estimator itself
+(see benchmarks/flat_forest.py).
+"""
+import numpy as np
+
+# Largest input FlatForest is faster on than the scikit-learn estimator
+MAX_ROWS = 128
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, children, is_leaf, value, roots, depth):
+        self.feature = feature      # (n_nodes,) split feature; 0 for leaves
+        self.threshold = threshold  # (n_nodes,) go left when x <= threshold
+        self.children = children    # (n_nodes, 2) global index of the left and right child
+        self.is_leaf = is_leaf      # (n_nodes,) bool
+        self.value = value          # (n_nodes,) regression output or (n_nodes, n_classes) probabilities
+        self.roots = roots          # (n_trees,) global index of each tree's root
+        self.depth = depth          # deepest tree's depth: steps until every row is at a leaf
+
+    @classmethod
+    def from_estimator(cls, forest):
+        """Flatten a fitted RandomForestRegressor or RandomForestClassifier."""
+        features, thresholds, children, leaves, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            if tree.n_outputs != 1:
+                raise ValueError("Only single-output forests can be flattened")
+            n = tree.node_count
+            leaf = tree.children_left == -1
+            own = np.arange(n)
+
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, 0.0, tree.threshold))
+            children.append(np.column_stack([
+                np.where(leaf, own, tree.children_left),
+                np.where(leaf, own, tree.children_right),
+            ]) + offset)
+            leaves.append(leaf)
+            if hasattr(forest, "classes_"):
+                # Leaf class counts/weights -> probabilities, as DecisionTreeClassifier.predict_proba
+                counts = tree.value[:, 0, :]
+                totals = counts.sum(axis=1, keepdims=True)
+                values.append(np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0))
+            else:
+                values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += n
+            depth = max(depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.concatenate(children).astype(np.intp),
+            is_leaf=np.concatenate(leaves),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            depth=depth,
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def leaves(self, X):
+        """(n_rows, n_trees) index of the leaf each row reaches in each tree."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        x = X.ravel()
+        children = self.children.ravel()
+
+        # One entry per (row, tree); those that reach a leaf are dropped from the walk
+        leaf = np.tile(self.roots, n_rows)
+        pending = np.arange(leaf.size)
+        node = leaf.copy()
+        row_start = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+        for _ in range(self.depth):
+            go_right = x[row_start + self.feature[node]] > self.threshold[node]
+            node = children[2 * node + go_right]
+            done = self.is_leaf[node]
+            if done.any():
+                leaf[pending[done]] = node[done]
+                walking = ~done
+                pending, node, row_start = pending[walking], node[walking], row_start[walking]
+                if not len(pending):
+                    break
+        return leaf.reshape(n_rows, self.n_trees)
+
+    def tree_outputs(self, X):
+        """Every tree's output for every row: (n_rows, n_trees), plus a class axis for classifiers."""
+        return self.value[self.leaves(X)]
+
+    def predict(self, X):
+        """Mean over trees, as RandomForestRegressor.predict."""
+        return self.tree_outputs(X).mean(axis=1)
+
+    def predict_proba(self, X):
+        """Mean class probabilities over trees, as RandomForestClassifier.predict_proba."""
+        return self.tree_outputs(X).mean(axis=1)
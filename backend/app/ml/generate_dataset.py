@@ -0,0 +1,345 @@
+"""Generate a large multi-user transaction dataset for load and ML benchmarks.
+
+Unlike seed_data.py, which rewrites a single test user, this creates many
+users at once. Their transactions are sampled with NumPy from the CATEGORIES
+amount ranges. Each user gets a fixed monthly rent and salary, and day-to-day
+spending rises and falls with the calendar month. The same --seed always
+produces the same users and transactions, whatever the number of workers,
+as long as --end is the same too: history runs up to --end, which defaults
+to today, so pass it explicitly to regenerate an earlier dataset.
+
+Users are generated in chunks by a process pool. In database mode each worker
+bulk-inserts its own chunk; with --output the rows are written to an NDJSON
+file (accepted as-is by POST /api/transactions/bulk) or a Parquet file (needs
+the `pyarrow` package) and nothing touches MongoDB.
+
+Usage:
+    python -m app.ml.generate_dataset --users 1000 --months 24 [--rebuild-rollups]
+    python -m app.ml.generate_dataset --users 1000 --end 2024-06-30 --replace
+    python -m app.ml.generate_dataset --users 1000 --output transactions.parquet
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import datetime
+import time
+
+import numpy as np
+from bson import ObjectId
+
+from app.ml.categories import CATEGORIES
+
+# Charged once a month on a per-user day instead of sampled
+RECURRING = {'Rent': (1, 5), 'Salary': (25, 28)}  # category -> (first, last) day of month
+
+# Share of day-to-day transactions per category
+VARIABLE_WEIGHTS = {'Food': 0.4, 'Travel': 0.2, 'Shopping': 0.15, 'Entertainment': 0.15, 'Bills': 0.1}
+
+# Multiplier on day-to-day spending, both count and amount, for January..December
+SEASONALITY = np.array([0.95, 0.9, 0.95, 1.0, 1.0, 1.05, 1.1, 1.0, 0.95, 1.1, 1.2, 1.35])
+
+# Month-to-month jitter of recurring amounts, as a fraction of the amount
+RECURRING_JITTER = 0.02
+
+# Leading bytes of every generated user _id ("gen\\0"), in place of a timestamp
+USER_ID_PREFIX = 0x67656e00
+
+CATEGORY_NAMES = list(CATEGORIES)
+VARIABLE = [CATEGORY_NAMES.index(name) for name in VARIABLE_WEIGHTS]
+VARIABLE_P = np.array(list(VARIABLE_WEIGHTS.values())) / sum(VARIABLE_WEIGHTS.values())
+RANGE_LOW = np.array([CATEGORIES[name]['range'][0] for name in CATEGORY_NAMES], dtype=float)
+RANGE_HIGH = np.array([CATEGORIES[name]['range'][1] for name in CATEGORY_NAMES], dtype=float)
+
+
+def expand_descriptions(category):
+    data = CATEGORIES[category]
+    if not data['places']:
+        return list(data['descriptions'])
+    return [template.format(place) for template in data['descriptions'] for place in data['places']]
+
+
+# Every possible description, so rows can carry an index instead of a string
+DESCRIPTIONS = []
+DESCRIPTION_OFFSET = np.zeros(len(CATEGORY_NAMES), dtype=np.int64)
+DESCRIPTION_COUNT = np.zeros(len(CATEGORY_NAMES), dtype=np.int64)
+for code, name in enumerate(CATEGORY_NAMES):
+    DESCRIPTION_OFFSET[code] = len(DESCRIPTIONS)
+    DESCRIPTIONS.extend(expand_descriptions(name))
+    DESCRIPTION_COUNT[code] = len(DESCRIPTIONS) - DESCRIPTION_OFFSET[code]
+
+
+def user_object_id(seed: int, index: int):
+    """Reproducible _id: a fixed prefix, then the seed, then the user index."""
+    return ObjectId(f"{USER_ID_PREFIX:08x}{seed & 0xffffffff:08x}{index:08x}")
+
+
+def generate_chunk(chunk_index, n_users, months, per_month, seed, start_month, end):
+    """Sample every transaction for n_users users as NumPy columns.
+
+    Returns a dict with `user` (index within the chunk), `amount`, `category`
+    (index into CATEGORY_NAMES), `description` (index into DESCRIPTIONS) and
+    `date` (datetime64[s]). Rows dated after `end` are dropped.
+    """
+    rng = np.random.default_rng([seed, chunk_index])
+    month_starts = np.arange(start_month, start_month + months)
+    month_start_s = month_starts.astype('datetime64[s]')
+    days_in_month = ((month_starts + 1).astype('datetime64[D]') - month_starts.astype('datetime64[D]')).astype(np.int64)
+    season = SEASONALITY[month_starts.astype(np.int64) % 12]
+
+    # Day-to-day spending: a Poisson number of rows per user and month
+    counts = rng.poisson(per_month * season, size=(n_users, months))
+    cell = np.repeat(np.arange(n_users * months), counts.ravel())
+    user, month = np.divmod(cell, months)
+    category = np.asarray(VARIABLE)[rng.choice(len(VARIABLE), size=len(cell), p=VARIABLE_P)]
+    amount = (RANGE_LOW[category] + rng.random(len(cell)) * (RANGE_HIGH - RANGE_LOW)[category]) * season[month]
+    offset = (rng.random(len(cell)) * days_in_month[month] * 86400).astype('timedelta64[s]')
+    columns = [(user, amount, category, month_start_s[month] + offset)]
+
+    # Recurring rent and salary: one row per user and month on a fixed day
+    user = np.repeat(np.arange(n_users), months)
+    month = np.tile(np.arange(months), n_users)
+    for name, (first_day, last_day) in RECURRING.items():
+        code = CATEGORY_NAMES.index(name)
+        base = RANGE_LOW[code] + rng.random(n_users) * (RANGE_HIGH[code] - RANGE_LOW[code])
+        day = rng.integers(first_day, last_day + 1, size=n_users)
+        amount = base[user] * (1 + RECURRING_JITTER * rng.standard_normal(len(user)))
+        offset = ((day[user] - 1) * 86400 + rng.integers(8 * 3600, 20 * 3600, size=len(user))).astype('timedelta64[s]')
+        columns.append((user, amount, np.full(len(user), code), month_start_s[month] + offset))
+
+    user, amount, category, date = (np.concatenate(parts) for parts in zip(*columns))
+    keep = date <= end
+    user, amount, category, date = user[keep], amount[keep], category[keep], date[keep]
+
+    # Salary is income; everything else is spending
+    amount = np.where(category == CATEGORY_NAMES.index('Salary'), amount, -amount).round(2)
+    description = DESCRIPTION_OFFSET[category] + (rng.random(len(category)) * DESCRIPTION_COUNT[category]).astype(np.int64)
+
+    # Chronological within each user, like real history
+    order = np.lexsort((date, user))
+    return {
+        'user': user[order],
+        'amount': amount[order],
+        'category': category[order],
+        'description': description[order],
+        'date': date[order],
+    }
+
+
+def iter_documents(columns, user_ids):
+    dates = columns['date'].astype('datetime64[ms]').tolist()  # -> datetime objects
+    for user, amount, category, description, date in zip(
+        columns['user'].tolist(), columns['amount'].tolist(), columns['category'].tolist(),
+        columns['description'].tolist(), dates,
+    ):
+        yield {
+            "user_id": user_ids[user],
+            "amount": amount,
+            "category": CATEGORY_NAMES[category],
+            "description": DESCRIPTIONS[description],
+            "date": date,
+        }
+
+
+def run_chunk(task):
+    """Pool entry point: generate one chunk of users and insert or return it."""
+    chunk_index, user_ids, options = task
+    columns = generate_chunk(
+        chunk_index, len(user_ids), options['months'], options['per_month'],
+        options['seed'], options['start_month'], options['end'],
+    )
+    if options['output']:
+        return chunk_index, user_ids, columns
+
+    from app.db import sync_db
+
+    batch = []
+    for doc in iter_documents(columns, user_ids):
+        batch.append(doc)
+        if len(batch) >= options['batch_size']:
+            sync_db.transactions.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        sync_db.transactions.insert_many(batch, ordered=False)
+    return chunk_index, user_ids, len(columns['amount'])
+
+
+class NdjsonWriter:
+    def __init__(self, path):
+        self._file = open(path, 'w')
+
+    def write(self, columns, user_ids):
+        for doc in iter_documents(columns, user_ids):
+            doc['date'] = doc['date'].isoformat()
+            self._file.write(json.dumps(doc) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires the 'pyarrow' package")
+        self._pa = pa
+        self._schema = pa.schema([
+            ('user_id', pa.string()),
+            ('amount', pa.float64()),
+            ('category', pa.dictionary(pa.int8(), pa.string())),
+            ('description', pa.string()),
+            ('date', pa.timestamp('s')),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, columns, user_ids):
+        pa = self._pa
+        table = pa.table({
+            'user_id': np.asarray(user_ids, dtype=object)[columns['user']],
+            'amount': columns['amount'],
+            'category': pa.DictionaryArray.from_arrays(
+                columns['category'].astype(np.int8), CATEGORY_NAMES
+            ),
+            'description': np.asarray(DESCRIPTIONS, dtype=object)[columns['description']],
+            'date': columns['date'],
+        }, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+def open_writer(path):
+    if path.endswith('.parquet'):
+        return ParquetWriter(path)
+    return NdjsonWriter(path)
+
+
+def user_email(email_prefix, index):
+    return f"{email_prefix}{index}@example.com"
+
+
+def create_users(user_ids, email_prefix, password, replace):
+    """Insert the generated users, all sharing one password hash."""
+    from app.auth import get_password_hash
+    from app.db import sync_db
+
+    object_ids = [ObjectId(user_id) for user_id in user_ids]
+    # By email, not _id: earlier runs may have used another seed or _id scheme
+    emails = [user_email(email_prefix, index) for index in range(len(user_ids))]
+    existing = [doc["_id"] for doc in sync_db.users.find({"email": {"$in": emails}}, {"_id": 1})]
+    if replace:
+        stale_ids = list({str(object_id) for object_id in existing} | set(user_ids))
+        sync_db.transactions.delete_many({"user_id": {"$in": stale_ids}})
+        sync_db.spending_rollups.delete_many({"user_id": {"$in": stale_ids}})
+        sync_db.users.delete_many({"_id": {"$in": [ObjectId(user_id) for user_id in stale_ids]}})
+    elif existing or sync_db.users.count_documents({"_id": {"$in": object_ids}}, limit=1):
+        raise SystemExit("Users from this seed or with these emails already exist; pass --replace to regenerate them")
+
+    hashed_password = get_password_hash(password)
+    sync_db.users.insert_many([
+        {
+            "_id": object_id,
+            "email": emails[index],
+            "username": f"{email_prefix}{index}",
+            "password": hashed_password,
+        }
+        for index, object_id in enumerate(object_ids)
+    ], ordered=False)
+
+
+async def refresh_derived_data(user_ids, rebuild_rollups):
+    """Regenerated users keep their _ids, so their summary ETags must change too."""
+    from app import data_versions, rollups
+    if rebuild_rollups:
+        await rollups.rebuild(user_ids)  # bumps their data versions too
+    else:
+        await data_versions.bump(user_ids)
+
+
+def main(args):
+    start = time.perf_counter()
+    # The last second of --end, but never in the future
+    end = min(np.datetime64(args.end, 'D') + 1 - np.timedelta64(1, 's'), np.datetime64(int(time.time()), 's'))
+    start_month = end.astype('datetime64[M]') - (args.months - 1)
+    user_ids = [str(user_object_id(args.seed, index)) for index in range(args.users)]
+    options = {
+        'months': args.months,
+        'per_month': args.transactions_per_month,
+        'seed': args.seed,
+        'start_month': start_month,
+        'end': end,
+        'output': args.output,
+        'batch_size': args.batch_size,
+    }
+    tasks = [
+        (chunk_index, user_ids[offset:offset + args.users_per_chunk], options)
+        for chunk_index, offset in enumerate(range(0, args.users, args.users_per_chunk))
+    ]
+
+    writer = open_writer(args.output) if args.output else None
+    if writer is None:
+        create_users(user_ids, args.email_prefix, args.password, args.replace)
+
+    total = 0
+    # spawn, not fork: workers open their own MongoDB connections
+    with multiprocessing.get_context("spawn").Pool(args.workers) as pool:
+        # Ordered when writing a file, so the output only depends on the seed
+        results = pool.imap(run_chunk, tasks) if writer else pool.imap_unordered(run_chunk, tasks)
+        for done, (_, chunk_user_ids, result) in enumerate(results, 1):
+            if writer:
+                writer.write(result, chunk_user_ids)
+                total += len(result['amount'])
+            else:
+                total += result
+            print(f"\r{done}/{len(tasks)} chunks, {total} transactions", end="", flush=True)
+    print()
+    if writer:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Generated {total} transactions for {args.users} users in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
+    if args.output:
+        print(f"Wrote {args.output}")
+    else:
+        asyncio.run(refresh_derived_data(user_ids, args.rebuild_rollups))
+        print(f"Users log in as {args.email_prefix}<n>@example.com with password {args.password!r}")
+        if args.rebuild_rollups:
+            print("Rebuilt spending rollups for the generated users")
+        else:
+            print("Their rollups were not built; generate with --rebuild-rollups to use the insights routes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a multi-user transaction dataset')
+    parser.add_argument('--users', type=int, default=1000,
+                      help='Number of users to generate (default: 1000)')
+    parser.add_argument('--months', type=int, default=24,
+                      help='Months of history per user, ending in the month of --end (default: 24)')
+    parser.add_argument('--end', default=datetime.date.today().isoformat(),
+                      help='Last day of history, YYYY-MM-DD; fix it to reproduce a dataset (default: today)')
+    parser.add_argument('--transactions-per-month', type=float, default=30,
+                      help='Average day-to-day transactions per user and month, before seasonality (default: 30)')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Random seed; the same seed and --end give the same dataset (default: 0)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                      help='Generator processes (default: one per CPU)')
+    parser.add_argument('--users-per-chunk', type=int, default=50,
+                      help='Users generated per pool task (default: 50)')
+    parser.add_argument('--batch-size', type=int, default=5000,
+                      help='Transactions per insert_many call (default: 5000)')
+    parser.add_argument('--output',
+                      help='Write to this .ndjson or .parquet file instead of MongoDB')
+    parser.add_argument('--email-prefix', default='loadtest',
+                      help='Users get <prefix><n>@example.com emails (default: loadtest)')
+    parser.add_argument('--password', default='password123',
+                      help='Password shared by all generated users (default: password123)')
+    parser.add_argument('--replace', action='store_true',
+                      help='Delete previously generated users from this seed and their data first')
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                      help='Rebuild the generated users\' spending rollups afterwards')
+
+    main(parser.parse_args())
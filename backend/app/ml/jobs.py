@@ -0,0 +1,278 @@
+"""Background training jobs.
+
+Model fits run in a small process pool so they never block the API's event
+loop. At most ML_TRAINING_WORKERS jobs train at once and at most
+ML_TRAINING_MAX_PENDING may be queued or running in this worker; beyond that
+`submit` raises JobQueueFull. Job state lives in the `ml_jobs` collection so
+any API worker can report on it.
+
+Each (user_id, model_type) trains at most once at a time. Concurrent submits
+within a worker share one call. Across workers, a lease document in
+`ml_leases` points at the queued or running job. The worker renews the lease
+every third of ML_TRAINING_LEASE_SECONDS, so it only expires once a worker
+stops renewing it, e.g. because it died, and can't block retraining forever.
+Its job is reported as failed once the lease has expired, and a worker
+shutting down fails its unfinished jobs itself. A job that loses its lease
+stops without recording a result.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.db import db
+from app.metrics import MODEL_TRAIN_SECONDS
+
+ML_TRAINING_WORKERS = int(os.getenv("ML_TRAINING_WORKERS", "1"))
+ML_TRAINING_MAX_PENDING = int(os.getenv("ML_TRAINING_MAX_PENDING", "32"))
+ML_TRAINING_LEASE_SECONDS = int(os.getenv("ML_TRAINING_LEASE_SECONDS", "900"))
+
+MODEL_TYPES = ("category", "next_month")
+
+UNFINISHED = ["queued", "running"]
+
+LEASE_LOST = "Training stopped: the job lost its training lease"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def lease_key(user_id: str, model_type: str):
+    return f"{model_type}:{user_id}"
+
+
+def run_training(model_type: str, user_id: str, incremental: bool):
+    """Entry point executed inside a pool process."""
+    if model_type == "category":
+        from app.ml.train_category import train_category_model as train
+    else:
+        from app.ml.train_next_month import train_next_month_model as train
+
+    start = time.perf_counter()
+    _, _, meta = train(user_id, incremental=incremental)
+    return {
+        "mode": meta["mode"],
+        "train_seconds": meta["seconds"],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def job_view(job):
+    return {
+        "job_id": str(job["_id"]),
+        "model_type": job["model_type"],
+        "incremental": job.get("incremental", False),
+        "status": job["status"],
+        "error": job.get("error"),
+        "result": job.get("result"),
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
+
+
+class TrainingQueue:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = None
+        self._pending = 0
+        self._tasks = set()
+        self._job_ids = set()  # jobs queued or running in this worker
+        self._submitting = {}  # (user_id, model_type) -> future of the submit in progress
+
+    def _ensure_started(self):
+        if self._executor is None:
+            # spawn, not fork: the parent holds MongoDB client threads and sockets
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._slots = asyncio.Semaphore(self.workers)
+
+    async def submit(self, user_id: str, model_type: str, incremental: bool = False):
+        """Queue a training run and return its job document.
+
+        Returns the existing job instead while one is queued or running for
+        the same user and model, in this worker or another.
+        """
+        if model_type not in MODEL_TYPES:
+            raise ValueError(f"Unknown model type: {model_type}")
+
+        key = (user_id, model_type)
+        submitting = self._submitting.get(key)
+        if submitting is not None:
+            return await asyncio.shield(submitting)
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # no "never retrieved" noise
+        self._submitting[key] = future
+        try:
+            job = await self._submit(user_id, model_type, incremental)
+            future.set_result(job)
+            return job
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._submitting[key]
+
+    async def _submit(self, user_id, model_type, incremental):
+        if self._pending >= self.max_pending:
+            raise JobQueueFull("Too many training jobs queued; try again later")
+
+        job = {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "model_type": model_type,
+            "incremental": incremental,
+            "status": "queued",
+            "created_at": datetime.utcnow(),
+        }
+        # Inserted before the lease is taken, so a lease always points at a stored job
+        await db.ml_jobs.insert_one(job)
+        running = await self._acquire_lease(user_id, model_type, job["_id"])
+        if running is not None:
+            await db.ml_jobs.delete_one({"_id": job["_id"]})
+            return running
+
+        self._ensure_started()
+        self._pending += 1
+        self._job_ids.add(job["_id"])
+        task = asyncio.create_task(self._run(job["_id"], user_id, model_type, incremental))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _acquire_lease(self, user_id, model_type, job_id):
+        """Take the training lease for job_id, or return the job that holds it."""
+        key = lease_key(user_id, model_type)
+        while True:
+            now = datetime.utcnow()
+            lease = {"_id": key, "job_id": job_id, "expires_at": now + timedelta(seconds=ML_TRAINING_LEASE_SECONDS)}
+            try:
+                await db.ml_leases.insert_one(lease)
+                return None
+            except DuplicateKeyError:
+                pass
+
+            held = await db.ml_leases.find_one({"_id": key})
+            if held is None:
+                continue  # released in between; try again
+            if held["expires_at"] > now:
+                job = await db.ml_jobs.find_one({"_id": held["job_id"]})
+                if job is not None:
+                    return job
+                # Lease outlived its job document; treat it as expired
+
+            # Expired but not yet removed by the TTL monitor: take it over
+            result = await db.ml_leases.replace_one({"_id": key, "job_id": held["job_id"]}, lease)
+            if result.modified_count:
+                return None
+
+    async def _renew_lease(self, key, job_id):
+        """Push the lease's expiry out again; False if job_id no longer holds it."""
+        result = await db.ml_leases.update_one(
+            {"_id": key, "job_id": job_id},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=ML_TRAINING_LEASE_SECONDS)}},
+        )
+        return result.matched_count == 1
+
+    async def _heartbeat(self, key, job_id, lost: asyncio.Event):
+        """Renew the lease until cancelled; sets lost if another job took it over."""
+        while True:
+            await asyncio.sleep(ML_TRAINING_LEASE_SECONDS / 3)
+            try:
+                if not await self._renew_lease(key, job_id):
+                    lost.set()
+                    return
+            except PyMongoError as e:
+                print(f"Failed to renew training lease {key}: {e}")  # retried on the next beat
+
+    async def _run(self, job_id, user_id, model_type, incremental):
+        key = lease_key(user_id, model_type)
+        lost = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(key, job_id, lost))
+        try:
+            async with self._slots:
+                if lost.is_set() or not await self._renew_lease(key, job_id):
+                    await self._update(job_id, "queued", status="failed", error=LEASE_LOST, finished_at=datetime.utcnow())
+                    return
+                if not await self._update(job_id, "queued", status="running", started_at=datetime.utcnow()):
+                    return  # failed by get() in the meantime
+                loop = asyncio.get_running_loop()
+                fit = loop.run_in_executor(self._executor, run_training, model_type, user_id, incremental)
+                lease_lost = asyncio.ensure_future(lost.wait())
+                try:
+                    await asyncio.wait({fit, lease_lost}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    lease_lost.cancel()
+                if not fit.done():
+                    # A fit can't be interrupted inside its process; its result is discarded
+                    fit.add_done_callback(lambda f: f.cancelled() or f.exception())
+                    await self._update(job_id, "running", status="failed", error=LEASE_LOST, finished_at=datetime.utcnow())
+                    return
+                try:
+                    result = fit.result()
+                except Exception as e:
+                    await self._update(job_id, "running", status="failed", error=str(e), finished_at=datetime.utcnow())
+                else:
+                    MODEL_TRAIN_SECONDS.labels(model_type, result["mode"]).observe(result["train_seconds"])
+                    await self._update(job_id, "running", status="succeeded", result=result, finished_at=datetime.utcnow())
+        finally:
+            heartbeat.cancel()
+            self._pending -= 1
+            self._job_ids.discard(job_id)
+            await db.ml_leases.delete_one({"_id": key, "job_id": job_id})
+
+    async def _update(self, job_id, expected_status, **fields):
+        """Update the job if it still has expected_status, so one failed by get() or shutdown() stays failed."""
+        result = await db.ml_jobs.update_one({"_id": job_id, "status": expected_status}, {"$set": fields})
+        return result.matched_count == 1
+
+    async def get(self, job_id: str, user_id: str):
+        try:
+            _id = ObjectId(job_id)
+        except InvalidId:
+            return None
+        job = await db.ml_jobs.find_one({"_id": _id, "user_id": user_id})
+        if job is None or job["status"] not in UNFINISHED:
+            return job
+
+        lease = await db.ml_leases.find_one({"_id": lease_key(user_id, job["model_type"]), "job_id": _id})
+        if lease is not None and lease["expires_at"] > datetime.utcnow():
+            return job
+        # No live lease: the worker running it died, or the run outlived its lease
+        failed = await db.ml_jobs.find_one_and_update(
+            {"_id": _id, "status": {"$in": UNFINISHED}},
+            {"$set": {"status": "failed", "error": "Training did not finish before its lease expired",
+                      "finished_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        # None if it finished in the meantime
+        return failed or await db.ml_jobs.find_one({"_id": _id})
+
+    async def shutdown(self):
+        job_ids = list(self._job_ids)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if job_ids:
+            # Nothing will finish these; fail them and free their leases for other workers
+            await db.ml_jobs.update_many(
+                {"_id": {"$in": job_ids}, "status": {"$in": UNFINISHED}},
+                {"$set": {"status": "failed", "error": "Server shut down before training finished",
+                          "finished_at": datetime.utcnow()}},
+            )
+            await db.ml_leases.delete_many({"job_id": {"$in": job_ids}})
+
+
+training_queue = TrainingQueue(ML_TRAINING_WORKERS, ML_TRAINING_MAX_PENDING)
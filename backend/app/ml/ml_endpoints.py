@@ -1,55 +1,200 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 from app.auth_utils import get_current_user
-from app.ml.train_next_month import train_next_month_model, predict_next_month
-from app.ml.train_category import train_category_model, predict_category
+from app.ml.registry import model_registry
+from app.metrics import MODEL_PREDICT_SECONDS
+from app.ml.jobs import training_queue, job_view, JobQueueFull
+from app.ml.bundles import POPULATION_ID, bundle_path
+from app.cache import insights_cache
+from app import rollups
 from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
+from types import SimpleNamespace
+import importlib
+import os
 
 router = APIRouter()
 
+# The training modules pull in pandas, numpy and scikit-learn. They are imported
+# on the first ML request (or by prewarm_ml) so the app and non-ML routes start
+# without paying for them.
+_ml = None
+
+def import_ml_stack():
+    return SimpleNamespace(
+        category=importlib.import_module("app.ml.train_category"),
+        next_month=importlib.import_module("app.ml.train_next_month"),
+        population=importlib.import_module("app.ml.population"),
+    )
+
+async def ml_stack():
+    """The training modules, imported in a worker thread on first use."""
+    global _ml
+    if _ml is None:
+        _ml = await run_in_threadpool(import_ml_stack)
+    return _ml
+
+async def prewarm_ml():
+    """Import the ML stack in the background, e.g. right after startup."""
+    try:
+        await ml_stack()
+    except Exception as e:
+        print(f"Failed to prewarm ML stack: {e}")
+
 class TransactionInput(BaseModel):
     amount: float = Field(..., description="Transaction amount (positive or negative)")
     date: Optional[datetime] = Field(default=None, description="Transaction date")
 
-@router.post("/train/next-month")
-async def train_next_month(current_user: dict = Depends(get_current_user)):
-    """Train the next month prediction model for the current user."""
+class BatchCategoryInput(BaseModel):
+    transactions: List[TransactionInput] = Field(..., min_length=1, max_length=1000)
+    top_k: Optional[int] = Field(default=3, ge=1, description="Categories to return per transaction")
+
+def training_data_error(ml, model_type: str, transactions: int, months: int):
+    """Why a model can't be trained on this much history, or None if it can."""
+    if transactions == 0:
+        return "No transactions found for user"
+    if model_type == "category" and transactions < ml.category.MIN_TRANSACTIONS:
+        return f"Not enough data to train model (need at least {ml.category.MIN_TRANSACTIONS} transactions)"
+    if model_type == "next_month" and months - 1 < ml.next_month.MIN_MONTH_PAIRS:
+        return f"Not enough data to train model (need at least {ml.next_month.MIN_MONTH_PAIRS} months)"
+    return None
+
+async def check_training_data(user_id: str, model_type: str):
+    """Reject training up front when the user can't have enough data yet."""
+    ml = await ml_stack()
+    transactions, months = await rollups.history_size(user_id)
+    error = training_data_error(ml, model_type, transactions, months)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+async def enqueue_training(user_id: str, model_type: str, incremental: bool = False):
+    try:
+        return await training_queue.submit(user_id, model_type, incremental)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def submit_training(user_id: str, model_type: str, incremental: bool = False):
+    await check_training_data(user_id, model_type)
+    return await enqueue_training(user_id, model_type, incremental)
+
+def accepted(job, message: str):
+    """202 response pointing the client at the job's status endpoint."""
+    job_id = str(job["_id"])
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder({**job_view(job), "message": message}),
+        headers={"Location": f"/api/ml/jobs/{job_id}"},
+    )
+
+async def run_prediction(metric: str, model: str, predict, bundle_id):
     try:
-        model, _ = train_next_month_model(str(current_user["_id"]))
-        return {"message": "Next month prediction model trained successfully"}
+        with MODEL_PREDICT_SECONDS.labels(metric, model).time():
+            return await run_in_threadpool(predict, bundle_id)
+    except FileNotFoundError:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error training model: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error making prediction: {str(e)}")
 
-@router.get("/predict/next-month")
-async def get_next_month_prediction(current_user: dict = Depends(get_current_user)):
-    """Get prediction for next month's total expenses."""
+async def predict_with_fallback(user_id: str, model_type: str, metric: str, predict, render):
+    """Predict with the user's own model, else with the shared population model.
+
+    predict(bundle_id) runs in a worker thread, with bundle_id None for the
+    user's own model. render(result, model) builds the response body, model
+    being "personal" or "population". A personal model is only queued for
+    training once the user's history passes the population module's threshold,
+    or when there is no population model to answer with instead.
+    """
     try:
-        prediction = predict_next_month(str(current_user["_id"]))
-        return prediction
+        return render(await run_prediction(metric, "personal", predict, None), "personal")
     except FileNotFoundError:
-        # If model doesn't exist, try to train it first
+        pass
+
+    ml = await ml_stack()
+    transactions, months = await rollups.history_size(user_id)
+    error = training_data_error(ml, model_type, transactions, months)
+    job = None
+    if error is None and ml.population.has_personal_history(model_type, transactions, months):
+        job = await enqueue_training(user_id, model_type)
+
+    try:
+        return render(await run_prediction(metric, "population", predict, POPULATION_ID), "population")
+    except FileNotFoundError:
+        pass
+
+    # No population model trained yet either: fall back to a personal model
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    if job is None:
+        job = await enqueue_training(user_id, model_type)
+    return accepted(job, "model warming")
+
+def model_stamp(user_id: str, model_type: str):
+    """Changes whenever the user's or the population model of model_type is retrained."""
+    stamps = []
+    for bundle_id in (user_id, POPULATION_ID):
         try:
-            train_next_month_model(str(current_user["_id"]))
-            prediction = predict_next_month(str(current_user["_id"]))
-            return prediction
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error making prediction: {str(e)}")
+            stamps.append(os.stat(bundle_path(model_type, bundle_id)).st_mtime_ns)
+        except FileNotFoundError:
+            stamps.append(0)
+    return "-".join(str(stamp) for stamp in stamps)
 
-@router.post("/train/category")
-async def train_category(current_user: dict = Depends(get_current_user)):
-    """Train the category prediction model for the current user."""
+async def next_month_prediction(user_id: str):
+    ml = await ml_stack()
+    return await predict_with_fallback(
+        user_id,
+        "next_month",
+        "next_month",
+        lambda bundle_id: ml.next_month.predict_next_month(user_id, bundle_id=bundle_id),
+        lambda prediction, model: {**prediction, "model": model},
+    )
+
+async def cached_next_month_prediction(user_id: str, stamp: str):
+    """next_month_prediction through the insights cache, keyed by model_stamp.
+
+    Returns None whenever the prediction route would not answer 200, e.g.
+    while a model is warming or with too little history, so the rest of a
+    dashboard still renders.
+    """
+    cached = await insights_cache.get(user_id, "next-month-prediction", stamp)
+    if cached is not None:
+        return cached
     try:
-        model, _ = train_category_model(str(current_user["_id"]))
-        return {"message": "Category prediction model trained successfully"}
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error training model: {str(e)}")
+        prediction = await next_month_prediction(user_id)
+    except HTTPException:
+        return None
+    if isinstance(prediction, JSONResponse):
+        return None  # model warming
+    await insights_cache.set(user_id, "next-month-prediction", stamp, prediction)
+    return prediction
+
+@router.post("/train/next-month")
+async def train_next_month(incremental: bool = True, current_user: dict = Depends(get_current_user)):
+    """Queue training of the next month prediction model for the current user.
+
+    Incremental runs are skipped when nothing changed since the last training.
+    """
+    job = await submit_training(str(current_user["_id"]), "next_month", incremental)
+    return accepted(job, "training queued")
+
+@router.get("/predict/next-month")
+async def get_next_month_prediction(current_user: dict = Depends(get_current_user)):
+    """Get prediction for next month's total expenses."""
+    return await next_month_prediction(str(current_user["_id"]))
+
+@router.post("/train/category")
+async def train_category(incremental: bool = True, current_user: dict = Depends(get_current_user)):
+    """Queue training of the category prediction model for the current user.
+
+    Incremental runs only fit transactions added since the last training,
+    falling back to a full refit when they differ too much.
+    """
+    job = await submit_training(str(current_user["_id"]), "category", incremental)
+    return accepted(job, "training queued")
 
 @router.post("/predict/category")
 async def predict_transaction_category(
@@ -57,24 +202,46 @@ async def predict_transaction_category(
     current_user: dict = Depends(get_current_user)
 ):
     """Predict category for a new transaction."""
-    try:
-        prediction = predict_category(
-            str(current_user["_id"]),
-            transaction.amount,
-            transaction.date
-        )
-        return prediction
-    except FileNotFoundError:
-        # If model doesn't exist, try to train it first
-        try:
-            train_category_model(str(current_user["_id"]))
-            prediction = predict_category(
-                str(current_user["_id"]),
-                transaction.amount,
-                transaction.date
-            )
-            return prediction
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error making prediction: {str(e)}")
\ No newline at end of file
+    ml = await ml_stack()
+    user_id = str(current_user["_id"])
+    return await predict_with_fallback(
+        user_id,
+        "category",
+        "category",
+        lambda bundle_id: ml.category.predict_category(
+            user_id, transaction.amount, transaction.date, bundle_id=bundle_id
+        ),
+        lambda prediction, model: {**prediction, "model": model},
+    )
+
+@router.post("/predict/category/batch")
+async def predict_transaction_categories(
+    batch: BatchCategoryInput,
+    current_user: dict = Depends(get_current_user)
+):
+    """Predict categories for many transactions at once, e.g. an imported statement."""
+    ml = await ml_stack()
+    user_id = str(current_user["_id"])
+    transactions = [(t.amount, t.date) for t in batch.transactions]
+    return await predict_with_fallback(
+        user_id,
+        "category",
+        "category_batch",
+        lambda bundle_id: ml.category.predict_categories(
+            user_id, transactions, batch.top_k, bundle_id=bundle_id
+        ),
+        lambda predictions, model: {"predictions": predictions, "model": model},
+    )
+
+@router.get("/jobs/{job_id}")
+async def get_training_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Status of a training job started by the current user."""
+    job = await training_queue.get(job_id, str(current_user["_id"]))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+@router.get("/registry-stats")
+async def get_registry_stats():
+    """Load/hit counters and resident size of the in-memory model registry (per worker)."""
+    return model_registry.stats()
@@ -0,0 +1,133 @@
+"""Shared population models for users without a personal model.
+
+One category model and one next-month model are trained offline across all
+users and saved as bundles under POPULATION_ID. Prediction routes fall back
+to them when a user has no personal model yet. A personal model is only
+trained once the user's history reaches PERSONAL_MIN_TRANSACTIONS
+transactions (category) or PERSONAL_MIN_MONTHS months (next month). Below
+that, a small personal forest fits noise and the population model predicts
+better.
+
+Usage:
+    python -m app.ml.population train [--model category|next_month] [--sample N]
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from app.db import sync_db
+from app.ml import train_category, train_next_month
+from app.ml.bundles import POPULATION_ID, save_bundle
+from app.ml.columns import aggregate_columns
+from app.ml.features import FEATURE_COLUMNS, month_stats
+
+# History a user needs before a personal model replaces the population one
+PERSONAL_MIN_TRANSACTIONS = int(os.getenv("ML_PERSONAL_MIN_TRANSACTIONS", "100"))
+PERSONAL_MIN_MONTHS = int(os.getenv("ML_PERSONAL_MIN_MONTHS", "6"))
+
+# Transactions sampled across all users for the category model
+POPULATION_SAMPLE = 200000
+
+# Many users' rows per leaf keeps the forest small and smooth
+MIN_SAMPLES_LEAF = 20
+
+# Shared MongoDB connection, opened on first use
+db = sync_db
+
+
+def train_population_category(sample=POPULATION_SAMPLE):
+    """Fit the category model on a random sample of every user's transactions."""
+    start = time.perf_counter()
+    columns = aggregate_columns(db.transactions, [{"$sample": {"size": sample}}])
+    if len(columns['amount']) < train_category.MIN_TRANSACTIONS:
+        raise ValueError("Not enough transactions to train a population model")
+
+    df, label_encoder = train_category.prepare_data(columns)
+    model = RandomForestClassifier(
+        n_estimators=train_category.BASE_ESTIMATORS,
+        min_samples_leaf=MIN_SAMPLES_LEAF,
+        n_jobs=-1,
+        random_state=42,
+    )
+    model.fit(df[train_category.FEATURES].values, df['category_encoded'].values)
+    model.set_params(n_jobs=None)  # predictions are single rows; threads only add overhead
+
+    meta = {
+        'n_samples': len(df),
+        'trained_at': datetime.utcnow(),
+        'mode': 'population',
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    save_bundle(train_category.MODEL_TYPE, POPULATION_ID, model=model, encoder=label_encoder,
+                features=train_category.FEATURES, meta=meta)
+    return meta
+
+
+def train_population_next_month():
+    """Fit the next-month model on consecutive months of every user."""
+    start = time.perf_counter()
+    months = list(db.spending_rollups.aggregate([
+        {"$match": {"count": {"$gt": 0}}},
+        {
+            "$group": {
+                "_id": {"user_id": "$user_id", "year": "$year", "month": "$month"},
+                "total": {"$sum": "$total"},
+                "sum_sq": {"$sum": "$sum_sq"},
+                "count": {"$sum": "$count"},
+            }
+        },
+        {"$sort": {"_id.user_id": 1, "_id.year": 1, "_id.month": 1}},
+    ], allowDiskUse=True))
+
+    stats = month_stats(months)
+    users = np.array([m["_id"]["user_id"] for m in months], dtype=object)
+    # Same pairs as a personal model: each month predicts the user's next recorded one
+    same_user = users[:-1] == users[1:]
+    X = stats[FEATURE_COLUMNS].values[:-1][same_user]
+    y = stats['total'].values[1:][same_user]
+    if len(X) < train_next_month.MIN_MONTH_PAIRS:
+        raise ValueError("Not enough monthly history to train a population model")
+
+    model = RandomForestRegressor(
+        n_estimators=100, min_samples_leaf=MIN_SAMPLES_LEAF, n_jobs=-1, random_state=42
+    )
+    model.fit(X, y)
+    model.set_params(n_jobs=None)
+
+    meta = {
+        'n_samples': len(X),
+        'n_users': len(set(users)),
+        'trained_at': datetime.utcnow(),
+        'mode': 'population',
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    save_bundle(train_next_month.MODEL_TYPE, POPULATION_ID, model=model, encoder=None,
+                features=FEATURE_COLUMNS, meta=meta)
+    return meta
+
+
+def has_personal_history(model_type, transactions, months):
+    """Whether a user's history is large enough to train a personal model."""
+    if model_type == train_category.MODEL_TYPE:
+        return transactions >= PERSONAL_MIN_TRANSACTIONS
+    return months >= PERSONAL_MIN_MONTHS
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Train the shared population models')
+    parser.add_argument('command', choices=['train'],
+                      help='train the population models and save them as bundles')
+    parser.add_argument('--model', choices=['category', 'next_month'], default=None,
+                      help='Only train this model (default: both)')
+    parser.add_argument('--sample', type=int, default=POPULATION_SAMPLE,
+                      help=f'Transactions sampled for the category model (default: {POPULATION_SAMPLE})')
+
+    args = parser.parse_args()
+    if args.model in (None, 'category'):
+        print(f"Category population model: {train_population_category(args.sample)}")
+    if args.model in (None, 'next_month'):
+        print(f"Next-month population model: {train_population_next_month()}")
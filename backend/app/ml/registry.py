@@ -0,0 +1,116 @@
+"""Process-wide cache of loaded model bundles.
+
+Bundles are kept in memory in LRU order until the private memory they hold
+exceeds MODEL_REGISTRY_MAX_BYTES. They are loaded memory-mapped: plain NumPy
+arrays, such as a FlatForest's, stay mapped and are shared with other
+workers through the page cache. scikit-learn copies each tree's nodes and
+values into private memory when it unpickles a tree, so fitted estimators
+are not shared and count against the budget. Every lookup stats the file
+and reloads it if its mtime or size has changed, so a model retrained by
+another worker is picked up on the next request.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from app.metrics import MODEL_LOAD_SECONDS
+
+MODEL_REGISTRY_MAX_BYTES = int(os.getenv("MODEL_REGISTRY_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def memory_bytes(obj):
+    """(private, mapped) bytes of the arrays reachable from a loaded object."""
+    import numpy as np
+    from sklearn.tree._tree import NODE_DTYPE, Tree
+
+    private = mapped = 0
+    stack, seen = [obj], set()
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.memmap):
+            mapped += item.nbytes
+        elif isinstance(item, np.ndarray):
+            private += item.nbytes
+            if item.dtype == object:
+                stack.extend(item.ravel())
+        elif isinstance(item, Tree):
+            private += item.node_count * NODE_DTYPE.itemsize + item.value.nbytes
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.extend(vars(item).values())
+    return private, mapped
+
+
+class ModelRegistry:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # path -> (version, (private, mapped) bytes, obj)
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def load(self, path: str):
+        """Return the object stored at path, loading it only if it changed on disk."""
+        stat = os.stat(path)  # raises FileNotFoundError for missing models
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2]
+
+        import joblib  # deferred: pulls in numpy, which non-ML routes don't need
+
+        # <models dir>/<model_type>/<user_id>.joblib -> model_type
+        artifact = os.path.basename(os.path.dirname(path))
+        with MODEL_LOAD_SECONDS.labels(artifact).time():
+            obj = joblib.load(path, mmap_mode="r")
+        size = memory_bytes(obj)
+
+        with self._lock:
+            self.loads += 1
+            self._entries[path] = (version, size, obj)
+            self._entries.move_to_end(path)
+            self._evict()
+        return obj
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def _evict(self):
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and self.resident_bytes() > self.max_bytes:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def resident_bytes(self):
+        """Private memory held by the loaded entries; mapped pages are shared and not counted."""
+        return sum(private for _, (private, _), _ in self._entries.values())
+
+    def mapped_bytes(self):
+        return sum(mapped for _, (_, mapped), _ in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes(),
+                "mapped_bytes": self.mapped_bytes(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+model_registry = ModelRegistry(MODEL_REGISTRY_MAX_BYTES)
@@ -1,19 +1,20 @@
 from faker import Faker
+import asyncio
 import random
 from datetime import datetime, timedelta
-from pymongo import MongoClient
+from app.db import sync_db
 from bson import ObjectId
-import os
 from dotenv import load_dotenv
 import argparse
 from passlib.context import CryptContext
+from app.ml.categories import CATEGORIES
+from app import rollups
 
 # Load environment variables
 load_dotenv()
 
-# MongoDB connection
-client = MongoClient(os.getenv("MONGODB_URI"))
-db = client.finance_db
+# Shared MongoDB connection, opened on first use
+db = sync_db
 
 # Initialize Faker and password context
 fake = Faker()
@@ -37,74 +38,6 @@ def get_or_create_test_user(email="test@example.com", password="password123"):
     
     return str(user["_id"])
 
-# Categories with their typical amount ranges and sample descriptions
-CATEGORIES = {
-    'Food': {
-        'range': (100, 2000),
-        'descriptions': [
-            'Lunch at {}', 'Dinner at {}', 'Groceries from {}',
-            'Food delivery from {}', 'Coffee at {}'
-        ],
-        'places': [
-            'Dominos', 'McDonald\'s', 'Subway', 'Local Cafe',
-            'Whole Foods', 'Restaurant', 'Starbucks'
-        ]
-    },
-    'Rent': {
-        'range': (15000, 50000),
-        'descriptions': ['Monthly Rent', 'House Rent', 'Apartment Rent'],
-        'places': []
-    },
-    'Travel': {
-        'range': (500, 5000),
-        'descriptions': [
-            'Uber to {}', 'Cab from {}', 'Bus ticket to {}',
-            'Train ticket to {}', 'Flight to {}'
-        ],
-        'places': [
-            'Airport', 'Office', 'Home', 'Mall', 'Station',
-            'Downtown', 'Market'
-        ]
-    },
-    'Shopping': {
-        'range': (500, 10000),
-        'descriptions': [
-            'Shopping at {}', 'Clothes from {}', 'Electronics from {}',
-            'Purchase at {}', 'Online order from {}'
-        ],
-        'places': [
-            'Amazon', 'Mall', 'Walmart', 'Target', 'Best Buy',
-            'Nike Store', 'Apple Store'
-        ]
-    },
-    'Entertainment': {
-        'range': (200, 3000),
-        'descriptions': [
-            'Movie at {}', 'Gaming subscription {}', 'Concert at {}',
-            'Streaming service {}', 'Entertainment at {}'
-        ],
-        'places': [
-            'Netflix', 'PVR Cinema', 'PlayStation', 'Spotify',
-            'Theme Park', 'Theatre'
-        ]
-    },
-    'Bills': {
-        'range': (1000, 8000),
-        'descriptions': [
-            'Electricity Bill', 'Water Bill', 'Internet Bill',
-            'Phone Bill', 'Gas Bill', 'Insurance Payment'
-        ],
-        'places': []
-    },
-    'Salary': {
-        'range': (50000, 150000),
-        'descriptions': [
-            'Monthly Salary', 'Salary Credit', 'Income'
-        ],
-        'places': []
-    }
-}
-
 def generate_transaction(user_id, date):
     category = random.choice(list(CATEGORIES.keys()))
     category_data = CATEGORIES[category]
@@ -163,6 +96,9 @@ def seed_transactions(user_id, num_months=18, transactions_per_month=(25, 35)):
         db.transactions.insert_many(all_transactions)
         print(f"Created {len(all_transactions)} transactions for user {user_id}")
 
+    # Written around the API, so rebuild the user's rollups (which also bumps their data version)
+    asyncio.run(rollups.rebuild([user_id]))
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Seed transaction data for testing ML models')
     parser.add_argument('--email', default='test@example.com',
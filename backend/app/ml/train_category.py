@@ -2,126 +2,209 @@ import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
-import pickle
 from datetime import datetime
-import joblib
-from pymongo import MongoClient
-import os
+import time
+from app.db import sync_db
 from dotenv import load_dotenv
+from app.ml.bundles import save_bundle, read_bundle, load_bundle, flat_forest
+from app.ml.flat_forest import MAX_ROWS as FLAT_FOREST_MAX_ROWS
+from app.ml.columns import find_columns
 
 # Load environment variables
 load_dotenv()
 
-# Get the current directory
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-MODELS_DIR = os.path.join(CURRENT_DIR, 'models')
+MODEL_TYPE = 'category'
 
-# MongoDB connection
-client = MongoClient(os.getenv("MONGODB_URI"))
-db = client.finance_db
+# Shared MongoDB connection, opened on first use
+db = sync_db
 
-# Ensure models directory exists
-os.makedirs(MODELS_DIR, exist_ok=True)
+# Fewest transactions a model is trained on
+MIN_TRANSACTIONS = 10
 
-def prepare_data(transactions):
-    """Convert transactions into a format suitable for category prediction."""
-    # Convert to DataFrame
-    df = pd.DataFrame(transactions)
-    
+FEATURES = ['amount', 'month', 'day', 'dayofweek']
+
+# Forest size after a full refit, and the most trees incremental updates may grow it to
+BASE_ESTIMATORS = 100
+MAX_ESTIMATORS = 300
+
+# Refit from scratch once new data exceeds this share of what the model was trained on
+INCREMENTAL_MAX_NEW_FRACTION = 0.5
+
+def prepare_data(columns, label_encoder=None):
+    """Convert transaction columns (see columns.py) into a format suitable for category prediction.
+
+    Fits a new LabelEncoder unless an existing one is passed in.
+    """
     # Create features
-    df['date'] = pd.to_datetime(df['date'])
-    df['month'] = df['date'].dt.month
-    df['day'] = df['date'].dt.day
-    df['dayofweek'] = df['date'].dt.dayofweek
-    df['amount'] = df['amount'].abs()  # Use absolute values for prediction
+    dates = pd.DatetimeIndex(columns['date'])
+    df = pd.DataFrame({
+        'amount': np.abs(columns['amount']),  # Use absolute values for prediction
+        'month': dates.month,
+        'day': dates.day,
+        'dayofweek': dates.dayofweek,
+    })
     
     # Encode categories
-    le = LabelEncoder()
-    df['category_encoded'] = le.fit_transform(df['category'])
+    if label_encoder is None:
+        label_encoder = LabelEncoder()
+        df['category_encoded'] = label_encoder.fit_transform(columns['category'])
+    else:
+        df['category_encoded'] = label_encoder.transform(columns['category'])
     
-    return df, le
+    return df, label_encoder
+
+def save_model(user_id, model, label_encoder, meta):
+    save_bundle(MODEL_TYPE, user_id, model=model, encoder=label_encoder, features=FEATURES, meta=meta)
+
+def extend_model(model, label_encoder, meta, new_columns):
+    """Add trees fitted on new transaction columns to an existing forest.
+
+    Returns None when the new data calls for a full refit instead.
+    """
+    n_new = len(new_columns['amount'])
+    if not np.isin(new_columns['category'], label_encoder.classes_).all():
+        return None  # unseen category: the encoder and every tree need it
+    if n_new > INCREMENTAL_MAX_NEW_FRACTION * meta['n_samples']:
+        return None  # too much drift for a few extra trees to absorb
+    extra_trees = max(1, round(BASE_ESTIMATORS * n_new / meta['n_samples']))
+    if len(model.estimators_) + extra_trees > MAX_ESTIMATORS:
+        return None  # compact the forest back to BASE_ESTIMATORS trees
+
+    df, _ = prepare_data(new_columns, label_encoder)
+    X = df[FEATURES].values
+    y = df['category_encoded'].values
+    weights = np.ones(len(y))
+
+    # Every class must appear for the new trees to line up with the old ones;
+    # pad with zero-weight rows for classes missing from this batch
+    missing = np.setdiff1d(np.arange(len(label_encoder.classes_)), y)
+    if len(missing):
+        X = np.vstack([X, np.repeat(X[:1], len(missing), axis=0)])
+        y = np.concatenate([y, missing])
+        weights = np.concatenate([weights, np.zeros(len(missing))])
+
+    # Without bootstrap each new tree sees every new row, never just padding
+    model.set_params(warm_start=True, bootstrap=False, n_estimators=len(model.estimators_) + extra_trees)
+    model.fit(X, y, sample_weight=weights)
+    model.set_params(warm_start=False, bootstrap=True)
+    return model
+
+def train_category_model(user_id, incremental=False):
+    """Train a model to predict transaction categories.
+
+    With incremental=True, only transactions newer than the saved model's
+    watermark are read and fitted as extra trees; large or structural changes
+    fall back to a full refit. Returns (model, label_encoder, meta), where meta
+    records the watermark, the mode used and how long training took.
+    """
+    start = time.perf_counter()
+
+    if incremental:
+        try:
+            bundle = read_bundle(MODEL_TYPE, user_id)
+            model, label_encoder, meta = bundle['model'], bundle['encoder'], bundle['meta']
+        except FileNotFoundError:
+            incremental = False
+
+    if incremental:
+        # _ids are assigned at insert time, so backdated transactions are still picked up
+        new_columns, watermark = find_columns(
+            db.transactions, {"user_id": user_id, "_id": {"$gt": meta['watermark']}}
+        )
+        if watermark is None:
+            meta = {**meta, 'mode': 'unchanged', 'seconds': round(time.perf_counter() - start, 3)}
+            return model, label_encoder, meta
+
+        if extend_model(model, label_encoder, meta, new_columns) is not None:
+            meta = {
+                'watermark': watermark,
+                'n_samples': meta['n_samples'] + len(new_columns['amount']),
+                'trained_at': datetime.utcnow(),
+                'mode': 'incremental',
+                'seconds': round(time.perf_counter() - start, 3),
+            }
+            save_model(user_id, model, label_encoder, meta)
+            return model, label_encoder, meta
 
-def train_category_model(user_id):
-    """Train a model to predict transaction categories."""
-    # Get user's transactions
-    transactions = list(db.transactions.find({"user_id": user_id}))
-    if not transactions:
+    # Get user's transactions: only the trained fields, as typed columns
+    columns, watermark = find_columns(db.transactions, {"user_id": user_id})
+    if watermark is None:
         raise ValueError("No transactions found for user")
     
     # Prepare data
-    df, label_encoder = prepare_data(transactions)
+    df, label_encoder = prepare_data(columns)
     
     # Create features and target
-    X = df[['amount', 'month', 'day', 'dayofweek']].values
+    X = df[FEATURES].values
     y = df['category_encoded'].values
     
-    if len(X) < 10:
-        raise ValueError("Not enough data to train model (need at least 10 transactions)")
+    if len(X) < MIN_TRANSACTIONS:
+        raise ValueError(f"Not enough data to train model (need at least {MIN_TRANSACTIONS} transactions)")
     
     # Train model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model = RandomForestClassifier(n_estimators=BASE_ESTIMATORS, random_state=42)
     model.fit(X, y)
     
-    # Save model and encoder
-    model_path = os.path.join(MODELS_DIR, f'category_{user_id}.joblib')
-    encoder_path = os.path.join(MODELS_DIR, f'category_encoder_{user_id}.joblib')
-    
-    joblib.dump(model, model_path)
-    joblib.dump(label_encoder, encoder_path)
+    # Save model, encoder and training watermark
+    meta = {
+        'watermark': watermark,
+        'n_samples': len(X),
+        'trained_at': datetime.utcnow(),
+        'mode': 'full',
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    save_model(user_id, model, label_encoder, meta)
     
-    return model, label_encoder
+    return model, label_encoder, meta
 
-def predict_category(user_id, amount, date=None):
-    """Predict the category for a new transaction."""
-    # Load model and encoder
-    try:
-        model_path = os.path.join(MODELS_DIR, f'category_{user_id}.joblib')
-        encoder_path = os.path.join(MODELS_DIR, f'category_encoder_{user_id}.joblib')
-        model = joblib.load(model_path)
-        label_encoder = joblib.load(encoder_path)
-    except FileNotFoundError:
-        try:
-            model, label_encoder = train_category_model(user_id)
-        except ValueError as e:
-            raise ValueError(str(e))
-    
-    # Prepare features
-    if date is None:
-        date = datetime.now()
-    
-    features = np.array([[
-        abs(amount),
-        date.month,
-        date.day,
-        date.weekday()
-    ]])
-    
-    # Make prediction
-    category_encoded = model.predict(features)[0]
-    predicted_category = label_encoder.inverse_transform([category_encoded])[0]
-    
-    # Get probabilities for all categories
-    probabilities = model.predict_proba(features)[0]
-    categories = label_encoder.inverse_transform(range(len(probabilities)))
-    
-    # Create sorted predictions with probabilities
-    predictions = [
-        {'category': cat, 'probability': round(float(prob), 3)}
-        for cat, prob in sorted(
-            zip(categories, probabilities),
-            key=lambda x: x[1],
-            reverse=True
-        )
+def predict_categories(user_id, transactions, top_k=None, bundle_id=None):
+    """Predict categories for many (amount, date) pairs with a single forest pass.
+
+    Returns one result per input, each listing the top_k most likely categories
+    (all categories when top_k is None). bundle_id selects another model than
+    the user's own, e.g. the population model.
+    """
+    # Load model and encoder (FileNotFoundError if the model isn't trained yet)
+    bundle = load_bundle(MODEL_TYPE, bundle_id or user_id)
+    model, label_encoder = bundle['model'], bundle['encoder']
+    
+    # Prepare one feature row per transaction
+    now = datetime.now()
+    rows = []
+    for amount, date in transactions:
+        date = date or now
+        rows.append([abs(amount), date.month, date.day, date.weekday()])
+    features = np.array(rows, dtype=float)
+    
+    # One pass over every tree for all rows; model.predict would be a second one.
+    # The flattened forest is faster for interactive batches, sklearn for bulk ones.
+    if len(features) <= FLAT_FOREST_MAX_ROWS:
+        probabilities = flat_forest(bundle).predict_proba(features)
+    else:
+        probabilities = model.predict_proba(features)
+    categories = label_encoder.inverse_transform(model.classes_)
+    
+    # Highest probability first, ties kept in class order
+    ranked = np.argsort(-probabilities, axis=1, kind='stable')[:, :top_k]
+    
+    return [
+        {
+            'predicted_category': str(categories[order[0]]),
+            'all_predictions': [
+                {'category': str(categories[j]), 'probability': round(float(row[j]), 3)}
+                for j in order
+            ]
+        }
+        for row, order in zip(probabilities, ranked)
     ]
-    
-    return {
-        'predicted_category': predicted_category,
-        'all_predictions': predictions
-    }
+
+def predict_category(user_id, amount, date=None, bundle_id=None):
+    """Predict the category for a new transaction."""
+    return predict_categories(user_id, [(amount, date)], bundle_id=bundle_id)[0]
 
 if __name__ == "__main__":
     # Example usage
     test_user_id = "your_test_user_id"  # Replace with actual user ID
-    model, _ = train_category_model(test_user_id)
+    model, _, meta = train_category_model(test_user_id)
     prediction = predict_category(test_user_id, 1500)
     print(f"Category prediction: {prediction}")
\ No newline at end of file
@@ -1,109 +1,102 @@
-import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder
-import pickle
-from datetime import datetime, timedelta
-import joblib
-from pymongo import MongoClient
-import os
+from datetime import datetime
+import time
+from app.db import sync_db
 from dotenv import load_dotenv
+from app.ml.bundles import save_bundle, read_bundle, load_bundle, flat_forest
+from app.ml.features import monthly_features, FEATURE_COLUMNS
 
 # Load environment variables
 load_dotenv()
 
-# Get the current directory
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-MODELS_DIR = os.path.join(CURRENT_DIR, 'models')
+MODEL_TYPE = 'next_month'
 
-# MongoDB connection
-client = MongoClient(os.getenv("MONGODB_URI"))
-db = client.finance_db
+# Shared MongoDB connection, opened on first use
+db = sync_db
 
-# Ensure models directory exists
-os.makedirs(MODELS_DIR, exist_ok=True)
+# Fewest month-to-next-month pairs a model is trained on
+MIN_MONTH_PAIRS = 3
 
-def prepare_data(transactions):
-    """Convert transactions into a format suitable for prediction."""
-    # Convert to DataFrame
-    df = pd.DataFrame(transactions)
-    
-    # Create date-based features
-    df['date'] = pd.to_datetime(df['date'])
-    df['month'] = df['date'].dt.month
-    df['day'] = df['date'].dt.day
-    df['dayofweek'] = df['date'].dt.dayofweek
+def prepare_data(user_id):
+    """Load the user's monthly aggregates from the feature store."""
+    monthly_stats, categories = monthly_features(db, user_id)
     
     # Encode categorical variables
     le = LabelEncoder()
-    df['category_encoded'] = le.fit_transform(df['category'])
-    
-    # Calculate monthly aggregates
-    monthly_stats = df.groupby(df['date'].dt.strftime('%Y-%m')).agg({
-        'amount': ['sum', 'mean', 'std', 'count']
-    }).reset_index()
-    monthly_stats.columns = ['month', 'total', 'mean', 'std', 'count']
-
-     # 🔧 Fill NaN or inf values safely
-    monthly_stats = monthly_stats.fillna(0)
-    monthly_stats = monthly_stats.replace([np.inf, -np.inf], 0)
+    le.fit(categories)
     
     return monthly_stats, le
 
-def train_next_month_model(user_id):
-    """Train a model to predict next month's total expenses."""
-    # Get user's transactions
-    transactions = list(db.transactions.find({"user_id": user_id}))
-    if not transactions:
+def train_next_month_model(user_id, incremental=False):
+    """Train a model to predict next month's total expenses.
+
+    The training set is one row per month from the feature store, so a full
+    refit is already cheap. With incremental=True it is skipped entirely when
+    no transactions arrived since the saved watermark. Returns
+    (model, label_encoder, meta).
+    """
+    start = time.perf_counter()
+
+    # Monthly aggregates, maintained incrementally as transactions arrive
+    monthly_stats, label_encoder = prepare_data(user_id)
+    if monthly_stats.empty:
         raise ValueError("No transactions found for user")
-    
-    # Prepare data
-    monthly_stats, label_encoder = prepare_data(transactions)
+    watermark = (monthly_stats['month'].iloc[-1], int(monthly_stats['count'].sum()))
+
+    if incremental:
+        try:
+            bundle = read_bundle(MODEL_TYPE, user_id)
+            if bundle['meta']['watermark'] == watermark:
+                meta = {**bundle['meta'], 'mode': 'unchanged', 'seconds': round(time.perf_counter() - start, 3)}
+                return bundle['model'], bundle['encoder'], meta
+        except FileNotFoundError:
+            pass
     
     # Create features and target
-    X = monthly_stats[['total', 'mean', 'std', 'count']].values[:-1]
+    X = monthly_stats[FEATURE_COLUMNS].values[:-1]
     y = monthly_stats['total'].values[1:]
     
-    if len(X) < 3:
-        raise ValueError("Not enough data to train model (need at least 3 months)")
+    if len(X) < MIN_MONTH_PAIRS:
+        raise ValueError(f"Not enough data to train model (need at least {MIN_MONTH_PAIRS} months)")
     
     # Train model
     model = RandomForestRegressor(n_estimators=100, random_state=42)
     model.fit(X, y)
     
-    # Save model and encoder
-    model_path = os.path.join(MODELS_DIR, f'next_month_{user_id}.joblib')
-    encoder_path = os.path.join(MODELS_DIR, f'label_encoder_{user_id}.joblib')
-    
-    joblib.dump(model, model_path)
-    joblib.dump(label_encoder, encoder_path)
+    # Save model, encoder and training watermark (latest month, transaction count)
+    meta = {
+        'watermark': watermark,
+        'trained_at': datetime.utcnow(),
+        'mode': 'full',
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    save_bundle(MODEL_TYPE, user_id, model=model, encoder=label_encoder, features=FEATURE_COLUMNS, meta=meta)
     
-    return model, label_encoder
+    return model, label_encoder, meta
 
-def predict_next_month(user_id):
-    """Predict the total expenses for next month."""
-    # Load model and encoder
-    try:
-        model_path = os.path.join(MODELS_DIR, f'next_month_{user_id}.joblib')
-        model = joblib.load(model_path)
-    except FileNotFoundError:
-        model, _ = train_next_month_model(user_id)
-    
-    # Get recent transactions
-    transactions = list(db.transactions.find({"user_id": user_id}))
-    monthly_stats, _ = prepare_data(transactions)
+def predict_next_month(user_id, bundle_id=None):
+    """Predict the total expenses for next month.
+
+    bundle_id selects another model than the user's own, e.g. the population
+    model; the features always come from the user's history.
+    """
+    # Load model (FileNotFoundError if the model isn't trained yet)
+    forest = flat_forest(load_bundle(MODEL_TYPE, bundle_id or user_id))
+    
+    # Latest month's aggregates from the feature store
+    monthly_stats, _ = monthly_features(db, user_id)
+    if monthly_stats.empty:
+        raise ValueError("No transactions found for user")
     
     # Prepare features for prediction
-    last_month = monthly_stats[['total', 'mean', 'std', 'count']].values[-1:]
-    
-    # Make prediction
-    prediction = model.predict(last_month)[0]
-    
-    # Calculate confidence interval (using model's estimators predictions)
-    predictions = []
-    for estimator in model.estimators_:
-        predictions.append(estimator.predict(last_month)[0])
+    last_month = monthly_stats[FEATURE_COLUMNS].values[-1:]
     
+    # Every tree's prediction in one pass: their mean is the forecast and
+    # their spread the confidence interval
+    predictions = forest.tree_outputs(last_month)[0]
+    prediction = predictions.mean()
     confidence_interval = np.percentile(predictions, [2.5, 97.5])
     
     return {
@@ -115,6 +108,6 @@ def predict_next_month(user_id):
 if __name__ == "__main__":
     # Example usage
     test_user_id = "your_test_user_id"  # Replace with actual user ID
-    model, _ = train_next_month_model(test_user_id)
+    model, _, meta = train_next_month_model(test_user_id)
     prediction = predict_next_month(test_user_id)
     print(f"Next month prediction: {prediction}")
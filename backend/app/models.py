@@ -1,6 +1,9 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
 from datetime import datetime
+import re
+
+DATE_ONLY = re.compile(r"\d{4}-\d{2}-\d{2}")
 
 class UserBase(BaseModel):
     email: str
@@ -19,9 +22,21 @@ class TransactionBase(BaseModel):
     description: Optional[str] = None
     date: datetime = Field(default_factory=datetime.now)
 
+    @field_validator("date", mode="before")
+    @classmethod
+    def parse_date_only(cls, value):
+        # Bank statements usually carry a plain YYYY-MM-DD date
+        if isinstance(value, str) and DATE_ONLY.fullmatch(value):
+            return f"{value}T00:00:00"
+        return value
+
 class TransactionCreate(TransactionBase):
     user_id: str
 
 class Transaction(TransactionBase):
     id: str
-    user_id: str
\ No newline at end of file
+    user_id: str
+
+class TransactionPage(BaseModel):
+    items: List[Transaction]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,189 @@
+"""JSON rendering and compression for large responses.
+
+FastJSONResponse is the app's default response class. JSON_RENDERER picks
+how it serializes:
+- "json" (default): the standard library, as Starlette's JSONResponse does
+- "orjson": several times faster on large lists; needs the `orjson` package
+
+Routes serving documents that were validated on the way into MongoDB return
+a FastJSONResponse themselves. That skips FastAPI's jsonable_encoder and
+response_model validation, which would otherwise walk every document again.
+Such content may contain datetimes but must already have the documented
+response shape.
+
+CompressionMiddleware compresses bodies of at least COMPRESSION_MIN_SIZE
+bytes with the best encoding the client accepts out of
+COMPRESSION_ENCODINGS. "br" needs the `brotli` package.
+"""
+import json
+import os
+import zlib
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+JSON_RENDERER = os.getenv("JSON_RENDERER", "json")
+COMPRESSION_ENCODINGS = [
+    e.strip() for e in os.getenv("COMPRESSION_ENCODINGS", "gzip").split(",") if e.strip()
+]
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Fast settings for dynamic content; higher levels cost far more CPU for a few % of bytes
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def create_dumps(name: str):
+    """Function rendering content to JSON bytes, like Starlette's JSONResponse."""
+    if name == "json":
+        def dumps(content):
+            return json.dumps(
+                content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+            ).encode("utf-8")
+        return dumps
+    if name == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            raise RuntimeError("JSON_RENDERER=orjson requires the 'orjson' package")
+
+        def dumps(content):
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return dumps
+    raise ValueError(f"Unknown JSON_RENDERER: {name}")
+
+
+dumps = create_dumps(JSON_RENDERER)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class GzipCompressor:
+    def __init__(self):
+        self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._zlib.flush()
+
+
+class BrotliCompressor:
+    def __init__(self):
+        import brotli
+
+        self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data)
+
+    def flush(self) -> bytes:
+        return self._brotli.flush()
+
+    def finish(self) -> bytes:
+        return self._brotli.finish()
+
+
+COMPRESSORS = {"gzip": GzipCompressor, "br": BrotliCompressor}
+
+
+def check_encodings(encodings):
+    for encoding in encodings:
+        if encoding not in COMPRESSORS:
+            raise ValueError(f"Unknown COMPRESSION_ENCODINGS entry: {encoding}")
+        if encoding == "br":
+            try:
+                import brotli  # noqa: F401
+            except ImportError:
+                raise RuntimeError("COMPRESSION_ENCODINGS=br requires the 'brotli' package")
+    return encodings
+
+
+def accepted_encodings(accept_encoding: str):
+    """Encodings named in an Accept-Encoding header, without those it refuses with q=0."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, *params = [p.strip() for p in part.split(";")]
+        refused = False
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    refused = float(value) == 0
+                except ValueError:
+                    pass
+        if name and not refused:
+            accepted.add(name.lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing large response bodies, streamed ones included."""
+
+    def __init__(self, app, encodings=None, minimum_size=None):
+        self.app = app
+        self.encodings = check_encodings(COMPRESSION_ENCODINGS if encodings is None else encodings)
+        self.minimum_size = COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        # Server preference order; the header's q-values only rule encodings out
+        encoding = next((e for e in self.encodings if e in accepted), None)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor = None  # set once the response is known to be compressed
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if "content-encoding" in headers or (not more_body and len(body) < max(self.minimum_size, 1)):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+
+                compressor = COMPRESSORS[encoding]()
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    return await send({"type": "http.response.body", "body": body})
+                await send(start)
+
+            # Streamed: flush every chunk so clients see rows as they are produced
+            chunk = compressor.compress(body) + (compressor.flush() if more_body else compressor.finish())
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
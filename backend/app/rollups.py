@@ -0,0 +1,346 @@
+"""Pre-aggregated monthly spending per (user_id, year, month, category).
+
+Every transaction write applies a $inc upsert to `spending_rollups`, so the
+insights routes read at most one document per month and category instead of
+re-aggregating raw transactions. Only the partial month at the start of a
+window is still summed from raw transactions. The running sum of squared
+amounts lets the ML feature store derive each month's standard deviation.
+
+Usage:
+    python -m app.rollups rebuild [--user-id <id>]
+    python -m app.rollups check [--user-id <id>]
+"""
+import argparse
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from app import data_versions
+from app.db import db
+
+
+def month_of(date: datetime):
+    """(year, month) of a transaction date as Mongo's $year/$month see it (UTC)."""
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc)
+    return date.year, date.month
+
+
+def next_month_start(date: datetime):
+    if date.month == 12:
+        return datetime(date.year + 1, 1, 1)
+    return datetime(date.year, date.month + 1, 1)
+
+
+async def apply_transactions(docs, sign=1):
+    """Fold inserted (sign=1) or deleted (sign=-1) transactions into the rollups."""
+    deltas = defaultdict(lambda: [0.0, 0.0, 0])
+    for doc in docs:
+        year, month = month_of(doc["date"])
+        delta = deltas[(doc["user_id"], year, month, doc["category"])]
+        delta[0] += doc["amount"]
+        delta[1] += doc["amount"] ** 2
+        delta[2] += 1
+
+    if not deltas:
+        return
+    await db.spending_rollups.bulk_write(
+        [
+            UpdateOne(
+                {"user_id": user_id, "year": year, "month": month, "category": category},
+                {"$inc": {"total": sign * total, "sum_sq": sign * sum_sq, "count": sign * count}},
+                upsert=True,
+            )
+            for (user_id, year, month, category), (total, sum_sq, count) in deltas.items()
+        ],
+        ordered=False,
+    )
+    if sign < 0:
+        # Drop months a user no longer has any transactions in
+        user_ids = list({user_id for user_id, _, _, _ in deltas})
+        await db.spending_rollups.delete_many({"user_id": {"$in": user_ids}, "count": {"$lte": 0}})
+
+
+def edge_filter(user_id: str, cutoff_date: datetime):
+    """Raw transactions in the partial month the window starts in."""
+    return {"user_id": user_id, "date": {"$gte": cutoff_date, "$lt": next_month_start(cutoff_date)}}
+
+
+def after_month_filter(user_id: str, cutoff_date: datetime):
+    """Rollups for every whole month after the one the window starts in."""
+    return {
+        "user_id": user_id,
+        "$or": [
+            {"year": {"$gt": cutoff_date.year}},
+            {"year": cutoff_date.year, "month": {"$gt": cutoff_date.month}},
+        ],
+    }
+
+
+def edge_by_category_pipeline(user_id: str, cutoff_date: datetime):
+    return [
+        {"$match": edge_filter(user_id, cutoff_date)},
+        {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}},
+    ]
+
+
+def rollup_by_category_pipeline(user_id: str, cutoff_date: datetime):
+    return [
+        {"$match": after_month_filter(user_id, cutoff_date)},
+        {"$group": {"_id": "$category", "total": {"$sum": "$total"}}},
+    ]
+
+
+def edge_total_pipeline(user_id: str, cutoff_date: datetime):
+    return [
+        {"$match": edge_filter(user_id, cutoff_date)},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}},
+    ]
+
+
+def rollup_by_month_pipeline(user_id: str, cutoff_date: datetime):
+    return [
+        {"$match": after_month_filter(user_id, cutoff_date)},
+        {"$group": {"_id": {"year": "$year", "month": "$month"}, "total": {"$sum": "$total"}}},
+    ]
+
+
+async def spending_by_category(user_id: str, cutoff_date: datetime):
+    """Total amount per category for transactions dated on or after cutoff_date."""
+    edge, months = await asyncio.gather(
+        db.transactions.aggregate(edge_by_category_pipeline(user_id, cutoff_date)).to_list(length=None),
+        db.spending_rollups.aggregate(rollup_by_category_pipeline(user_id, cutoff_date)).to_list(length=None),
+    )
+    totals = defaultdict(float)
+    for r in edge + months:
+        totals[r["_id"]] += r["total"]
+    return totals
+
+
+async def monthly_totals(user_id: str, cutoff_date: datetime):
+    """Total amount per (year, month) for transactions dated on or after cutoff_date."""
+    edge, months = await asyncio.gather(
+        db.transactions.aggregate(edge_total_pipeline(user_id, cutoff_date)).to_list(length=None),
+        db.spending_rollups.aggregate(rollup_by_month_pipeline(user_id, cutoff_date)).to_list(length=None),
+    )
+    totals = {(r["_id"]["year"], r["_id"]["month"]): r["total"] for r in months}
+    # $group with _id None emits nothing for no input, so an empty edge month stays out
+    if edge:
+        totals[(cutoff_date.year, cutoff_date.month)] = edge[0]["total"]
+    return dict(sorted(totals.items()))
+
+
+def summary_pipeline(user_id: str, category_cutoff: datetime, trend_cutoff: datetime, recent: int):
+    """The single aggregation behind GET /api/insights/summary.
+
+    Runs on spending_rollups and pulls in each window's partial first month
+    and the latest transactions with $unionWith, so every branch starts with
+    an indexed $match. The final $facet splits the tagged rows into spending
+    by category, the monthly trend and the recent transactions.
+    """
+    def tagged(source):
+        return {"$addFields": {"source": {"$literal": source}}}
+
+    def edge(source, cutoff_date):
+        return {
+            "$unionWith": {
+                "coll": "transactions",
+                "pipeline": [
+                    {"$match": edge_filter(user_id, cutoff_date)},
+                    {"$project": {"_id": 0, "user_id": 1, "category": 1, "total": "$amount", "source": {"$literal": source}}},
+                ],
+            }
+        }
+
+    return [
+        {"$match": after_month_filter(user_id, min(category_cutoff, trend_cutoff))},
+        tagged("rollup"),
+        edge("category_edge", category_cutoff),
+        edge("trend_edge", trend_cutoff),
+        {
+            "$unionWith": {
+                "coll": "transactions",
+                "pipeline": [
+                    {"$match": {"user_id": user_id}},
+                    {"$sort": {"date": -1, "_id": -1}},
+                    {"$limit": recent},
+                    tagged("recent"),
+                ],
+            }
+        },
+        {
+            "$facet": {
+                "by_category": [
+                    {"$match": {"$or": [
+                        {"source": "category_edge"},
+                        {"source": "rollup", **after_month_filter(user_id, category_cutoff)},
+                    ]}},
+                    {"$group": {"_id": "$category", "total": {"$sum": "$total"}}},
+                ],
+                "by_month": [
+                    {"$match": {"source": "rollup", **after_month_filter(user_id, trend_cutoff)}},
+                    {"$group": {"_id": {"year": "$year", "month": "$month"}, "total": {"$sum": "$total"}}},
+                ],
+                "trend_edge": [
+                    {"$match": {"source": "trend_edge"}},
+                    {"$group": {"_id": None, "total": {"$sum": "$total"}}},
+                ],
+                "recent": [
+                    {"$match": {"source": "recent"}},
+                    {"$sort": {"date": -1, "_id": -1}},
+                    {"$project": {"source": 0}},
+                ],
+            }
+        },
+    ]
+
+
+async def summary(user_id: str, category_cutoff: datetime, trend_cutoff: datetime, recent: int):
+    """(spending by category, monthly totals, latest transactions) in one round trip.
+
+    The totals match spending_by_category and monthly_totals for the same cutoffs.
+    """
+    pipeline = summary_pipeline(user_id, category_cutoff, trend_cutoff, recent)
+    [result] = await db.spending_rollups.aggregate(pipeline).to_list(length=None)
+
+    by_category = {r["_id"]: r["total"] for r in result["by_category"]}
+    totals = {(r["_id"]["year"], r["_id"]["month"]): r["total"] for r in result["by_month"]}
+    edge = result["trend_edge"]
+    if edge:
+        totals[(trend_cutoff.year, trend_cutoff.month)] = edge[0]["total"]
+    return by_category, dict(sorted(totals.items())), result["recent"]
+
+
+async def history_size(user_id: str):
+    """(number of transactions, number of distinct months) a user has recorded."""
+    months = await db.spending_rollups.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": {"year": "$year", "month": "$month"}, "count": {"$sum": "$count"}}},
+    ]).to_list(length=None)
+    return sum(m["count"] for m in months), len(months)
+
+
+def raw_rollup_pipeline(user_id=None):
+    """Aggregate raw transactions into rollup-shaped documents.
+
+    user_id may be a single id or a {"$in": [...]} condition.
+    """
+    pipeline = [{"$match": {"user_id": user_id}}] if user_id else []
+    return pipeline + [
+        {
+            "$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "year": {"$year": "$date"},
+                    "month": {"$month": "$date"},
+                    "category": "$category",
+                },
+                "total": {"$sum": "$amount"},
+                "sum_sq": {"$sum": {"$multiply": ["$amount", "$amount"]}},
+                "count": {"$sum": 1},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "user_id": "$_id.user_id",
+                "year": "$_id.year",
+                "month": "$_id.month",
+                "category": "$_id.category",
+                "total": 1,
+                "sum_sq": 1,
+                "count": 1,
+            }
+        },
+    ]
+
+
+async def rebuild(user_ids=None):
+    """Regenerate rollups from raw transactions for the given users, or everyone.
+
+    Writes landing for those users while this runs can be lost; run it when
+    the API is quiet.
+    """
+    match = {"$in": list(user_ids)} if user_ids is not None else None
+    await db.spending_rollups.delete_many({"user_id": match} if match else {})
+    pipeline = raw_rollup_pipeline(match) + [
+        {
+            "$merge": {
+                "into": "spending_rollups",
+                "on": ["user_id", "year", "month", "category"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        }
+    ]
+    await db.transactions.aggregate(pipeline).to_list(length=None)
+    if user_ids is not None:
+        await data_versions.bump(list(user_ids))
+    else:
+        await data_versions.bump_all()
+
+
+def rollup_key(doc):
+    return doc["user_id"], doc["year"], doc["month"], doc["category"]
+
+
+async def check(user_id=None, tolerance=0.01):
+    """Compare rollups with a fresh aggregation of raw transactions.
+
+    Returns a list of (key, expected, actual) tuples where they disagree, each
+    side being (total, sum_sq, count).
+    """
+    def values(doc):
+        return doc["total"], doc.get("sum_sq", 0.0), doc["count"]
+
+    user_ids = [user_id] if user_id else await db.transactions.distinct("user_id")
+    mismatches = []
+    for uid in user_ids:
+        expected = {
+            rollup_key(doc): values(doc)
+            async for doc in db.transactions.aggregate(raw_rollup_pipeline(uid))
+        }
+        actual = {
+            rollup_key(doc): values(doc)
+            async for doc in db.spending_rollups.find({"user_id": uid})
+        }
+        for key in expected.keys() | actual.keys():
+            want = expected.get(key, (0.0, 0.0, 0))
+            got = actual.get(key, (0.0, 0.0, 0))
+            if (
+                abs(want[0] - got[0]) > tolerance
+                # sum_sq grows quadratically with amounts, so compare it relatively
+                or abs(want[1] - got[1]) > 1e-6 * max(1.0, abs(want[1]))
+                or want[2] != got[2]
+            ):
+                mismatches.append((key, want, got))
+    return mismatches
+
+
+async def main(args):
+    if args.command == "rebuild":
+        await rebuild([args.user_id] if args.user_id else None)
+        print("Rebuilt spending rollups" + (f" for user {args.user_id}" if args.user_id else ""))
+        return 0
+
+    mismatches = await check(args.user_id)
+    for key, want, got in mismatches:
+        print(
+            f"{key}: raw total={want[0]:.2f} sum_sq={want[1]:.2f} count={want[2]}, "
+            f"rollup total={got[0]:.2f} sum_sq={got[1]:.2f} count={got[2]}"
+        )
+    print(f"{len(mismatches)} mismatched rollup(s)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Maintain the spending rollups used by the insights routes')
+    parser.add_argument('command', choices=['rebuild', 'check'],
+                      help='rebuild rollups from raw data, or check them against it')
+    parser.add_argument('--user-id', default=None,
+                      help='Limit to one user (default: all users)')
+
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,56 +1,103 @@
-from fastapi import APIRouter
-from app.db import db
-from typing import List, Dict
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import Response
+from app import rollups, data_versions
+from app.auth_utils import get_current_user
+from app.cache import insights_cache
+from app.ml import ml_endpoints
+from app.responses import FastJSONResponse
+from app.routes.transactions import transaction_json
+from typing import List, Dict, Optional
+from datetime import date, datetime, time, timedelta
+import asyncio
+import hashlib
 
 router = APIRouter()
 
+# Browsers must revalidate, which is cheap: a matching ETag costs one lookup
+SUMMARY_CACHE_CONTROL = "private, no-cache"
+
+def etag_matches(if_none_match: Optional[str], etag: str):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
 @router.get("/spending-by-category/{user_id}")
 async def get_spending_by_category(user_id: str, days: int = 30):
+    cached = await insights_cache.get(user_id, "spending-by-category", days)
+    if cached is not None:
+        return cached
+
     cutoff_date = datetime.now() - timedelta(days=days)
-    
-    pipeline = [
-        {
-            "$match": {
-                "user_id": user_id,
-                "date": {"$gte": cutoff_date}
-            }
-        },
-        {
-            "$group": {
-                "_id": "$category",
-                "total": {"$sum": "$amount"}
-            }
-        }
-    ]
-    
-    results = list(db.transactions.aggregate(pipeline))
-    return [{"category": r["_id"], "amount": r["total"]} for r in results]
+    totals = await rollups.spending_by_category(user_id, cutoff_date)
+    result = [{"category": category, "amount": total} for category, total in totals.items()]
+    await insights_cache.set(user_id, "spending-by-category", days, result)
+    return result
 
 @router.get("/monthly-trend/{user_id}")
 async def get_monthly_trend(user_id: str, months: int = 6):
+    cached = await insights_cache.get(user_id, "monthly-trend", months)
+    if cached is not None:
+        return cached
+
     cutoff_date = datetime.now() - timedelta(days=months * 30)
-    
-    pipeline = [
-        {
-            "$match": {
-                "user_id": user_id,
-                "date": {"$gte": cutoff_date}
-            }
-        },
-        {
-            "$group": {
-                "_id": {
-                    "year": {"$year": "$date"},
-                    "month": {"$month": "$date"}
-                },
-                "total": {"$sum": "$amount"}
-            }
+    totals = await rollups.monthly_totals(user_id, cutoff_date)
+    result = [{"year": year, "month": month, "amount": total} for (year, month), total in totals.items()]
+    await insights_cache.set(user_id, "monthly-trend", months, result)
+    return result
+
+@router.get("/summary")
+async def get_summary(
+    request: Request,
+    days: int = 30,
+    months: int = 6,
+    recent: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+):
+    """Everything the dashboard shows, in one response.
+
+    Spending by category over `days`, the monthly trend over `months`, the
+    `recent` latest transactions and the next-month prediction. Windows start
+    at midnight, so the body only changes with the user's data, their models
+    or the date. The ETag covers all three, and a matching If-None-Match is
+    answered with 304 before anything is aggregated. A response without a
+    prediction carries no ETag, so the next request tries the prediction again.
+    """
+    user_id = str(current_user["_id"])
+    today = date.today()
+    version = await data_versions.get(user_id)
+    stamp = ml_endpoints.model_stamp(user_id, "next_month")
+    key = f"{user_id}|{version}|{stamp}|{today}|{days}|{months}|{recent}"
+    etag = f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": SUMMARY_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    midnight = datetime.combine(today, time())
+    (by_category, by_month, latest), prediction = await asyncio.gather(
+        rollups.summary(
+            user_id, midnight - timedelta(days=days), midnight - timedelta(days=months * 30), recent
+        ),
+        ml_endpoints.cached_next_month_prediction(user_id, stamp),
+    )
+    if prediction is None:
+        # Warming, queue full or failed: an ETag would keep the null until the data changes
+        headers = {"Cache-Control": "no-store"}
+    return FastJSONResponse(
+        content={
+            "spending_by_category": [
+                {"category": category, "amount": total} for category, total in by_category.items()
+            ],
+            "monthly_trend": [
+                {"year": year, "month": month, "amount": total} for (year, month), total in by_month.items()
+            ],
+            "recent_transactions": [transaction_json(doc) for doc in latest],
+            "next_month_prediction": prediction,
         },
-        {
-            "$sort": {"_id.year": 1, "_id.month": 1}
-        }
-    ]
-    
-    results = list(db.transactions.aggregate(pipeline))
-    return [{"year": r["_id"]["year"], "month": r["_id"]["month"], "amount": r["total"]} for r in results]
\ No newline at end of file
+        headers=headers,
+    )
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """Hit/miss counters for sizing the insights cache (per worker)."""
+    return insights_cache.stats()
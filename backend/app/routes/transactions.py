@@ -1,32 +1,307 @@
-from fastapi import APIRouter, HTTPException, Depends
-from app.models import Transaction, TransactionCreate
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from app.models import Transaction, TransactionCreate, TransactionPage
 from app.db import db
+from app import rollups, data_versions
+from app.cache import insights_cache
+from app.responses import FastJSONResponse, dumps
 from bson import ObjectId
-from typing import List
+from bson.errors import InvalidId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from typing import Optional
 from datetime import datetime
+import base64
+import csv
+import json
 
 router = APIRouter()
 
+# Newest first; _id breaks ties between transactions sharing a timestamp
+SORT_ORDER = [("date", -1), ("_id", -1)]
+STREAM_BATCH_SIZE = 500
+BULK_CHUNK_SIZE = 1000
+UPLOAD_READ_SIZE = 64 * 1024
+
+def encode_cursor(doc):
+    raw = f"{doc['date'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date, _id = raw.split("|")
+        return datetime.fromisoformat(date), ObjectId(_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def transactions_filter(
+    user_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category: Optional[str] = None,
+    cursor: Optional[str] = None,
+):
+    """Build the Mongo filter for a user's transactions listing."""
+    query = {"user_id": user_id}
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lt"] = end_date
+    if category:
+        query["category"] = category
+    if cursor:
+        # Keyset pagination: continue strictly after the last (date, _id) seen
+        date, _id = decode_cursor(cursor)
+        query = {
+            "$and": [
+                query,
+                {"$or": [
+                    {"date": {"$lt": date}},
+                    {"date": date, "_id": {"$lt": _id}},
+                ]},
+            ]
+        }
+    return query
+
+def transaction_json(doc):
+    """A stored transaction in the Transaction response shape.
+
+    Documents were validated by TransactionCreate before they were written,
+    so this only renames and converts fields instead of validating again.
+    """
+    return {
+        "amount": float(doc["amount"]),
+        "category": doc["category"],
+        "description": doc.get("description"),
+        "date": doc["date"],
+        "id": str(doc["_id"]),
+        "user_id": doc["user_id"],
+    }
+
+async def stream_transactions(cursor):
+    """Yield NDJSON lines straight from the cursor, one batch at a time."""
+    batch = []
+    async for doc in cursor:
+        batch.append(dumps(transaction_json(doc)))
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield b"\n".join(batch) + b"\n"
+            batch = []
+    if batch:
+        yield b"\n".join(batch) + b"\n"
+
+async def after_insert(docs):
+    """Keep derived data in step with newly written transactions."""
+    await rollups.apply_transactions(docs)
+    user_ids = list({doc["user_id"] for doc in docs})
+    await data_versions.bump(user_ids)
+    for user_id in user_ids:
+        await insights_cache.invalidate_user(user_id)
+
+async def iter_lines(chunks):
+    """Split an async stream of byte chunks into decoded text lines."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+async def iter_upload(upload):
+    while chunk := await upload.read(UPLOAD_READ_SIZE):
+        yield chunk
+
+async def iter_ndjson_rows(lines):
+    async for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+def csv_quote_open(line: str, in_quotes: bool):
+    """Whether a quoted field is still open after line, given whether one was before it.
+
+    Follows csv.reader's default dialect: only a quote at the start of a
+    field opens a quoted section, "" inside it is an escaped quote, and
+    any other quote is an ordinary character.
+    """
+    field_start = not in_quotes
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if in_quotes:
+            if char == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    in_quotes = False
+        elif char == '"' and field_start:
+            in_quotes = True
+        field_start = not in_quotes and char == ","
+        i += 1
+    return in_quotes
+
+async def iter_csv_records(lines):
+    """Lines joined into CSV records; a quoted field may span several lines."""
+    record = None
+    in_quotes = False
+    async for line in lines:
+        if record is None:
+            if not line.strip():
+                continue
+            record = line
+        else:
+            record = f"{record}\n{line}"
+        in_quotes = csv_quote_open(line, in_quotes)
+        if not in_quotes:
+            yield record
+            record = None
+    if record is not None:
+        yield record
+
+async def iter_csv_rows(lines):
+    header = None
+    async for record in iter_csv_records(lines):
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        # Empty cells fall back to the model defaults
+        yield {k: v for k, v in zip(header, values) if v != ""}
+
+async def iter_json_rows(body):
+    rows = json.loads(body)
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of transactions")
+    for row in rows:
+        yield row
+
+def bulk_row_source(content_type: str, chunks, read_body):
+    """Pick a row parser for the upload's declared format."""
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return iter_ndjson_rows(iter_lines(chunks))
+    if "csv" in content_type:
+        return iter_csv_rows(iter_lines(chunks))
+    if "json" in content_type:
+        async def rows():
+            async for row in iter_json_rows(await read_body()):
+                yield row
+        return rows()
+    raise HTTPException(
+        status_code=415,
+        detail="Expected application/json, application/x-ndjson or text/csv",
+    )
+
+def format_validation_error(e: ValidationError):
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+    )
+
+async def insert_chunk(docs, rows, report):
+    """Insert one chunk unordered so a bad document doesn't stop the rest."""
+    try:
+        await db.transactions.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        failed = set()
+        for err in e.details.get("writeErrors", []):
+            failed.add(err["index"])
+            report["errors"].append({"row": rows[err["index"]], "error": err["errmsg"]})
+        docs = [doc for i, doc in enumerate(docs) if i not in failed]
+    report["inserted"] += len(docs)
+    await after_insert(docs)
+
 @router.post("/", response_model=Transaction)
 async def create_transaction(transaction: TransactionCreate):
     transaction_dict = transaction.dict()
     transaction_dict["_id"] = ObjectId()
-    db.transactions.insert_one(transaction_dict)
+    await db.transactions.insert_one(transaction_dict)
+    await after_insert([transaction_dict])
     return {**transaction_dict, "id": str(transaction_dict["_id"])}
 
-@router.get("/", response_model=List[Transaction])
-async def get_transactions(user_id: str):
-    transactions = []
-    cursor = db.transactions.find({"user_id": user_id})
-    for doc in cursor:
-        doc["id"] = str(doc["_id"])
-        transactions.append(doc)
-    return transactions
+@router.post("/bulk")
+async def create_transactions_bulk(request: Request, user_id: Optional[str] = None):
+    """Import many transactions from a JSON array, NDJSON or CSV body or file upload.
+
+    Rows are validated as they are read and written in unordered chunks of
+    BULK_CHUNK_SIZE. Rows without a user_id take the one from the query string.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing 'file' upload")
+        upload_type = upload.content_type or ""
+        if upload.filename and upload.filename.lower().endswith(".csv"):
+            upload_type = "text/csv"
+        elif upload.filename and upload.filename.lower().endswith((".ndjson", ".jsonl")):
+            upload_type = "application/x-ndjson"
+        rows = bulk_row_source(upload_type, iter_upload(upload), upload.read)
+    else:
+        rows = bulk_row_source(content_type, request.stream(), request.body)
+
+    report = {"inserted": 0, "errors": []}
+    docs, doc_rows = [], []
+    row_number = 0
+    try:
+        async for row in rows:
+            row_number += 1
+            if not isinstance(row, dict):
+                report["errors"].append({"row": row_number, "error": "Expected an object"})
+                continue
+            if user_id and "user_id" not in row:
+                row["user_id"] = user_id
+            try:
+                transaction = TransactionCreate.model_validate(row)
+            except ValidationError as e:
+                report["errors"].append({"row": row_number, "error": format_validation_error(e)})
+                continue
+
+            doc = transaction.dict()
+            doc["_id"] = ObjectId()
+            docs.append(doc)
+            doc_rows.append(row_number)
+            if len(docs) >= BULK_CHUNK_SIZE:
+                await insert_chunk(docs, doc_rows, report)
+                docs, doc_rows = [], []
+    except (ValueError, csv.Error) as e:
+        # Malformed input: keep what was already written and report where parsing stopped
+        report["errors"].append({"row": row_number + 1, "error": f"Could not parse row: {e}"})
+
+    if docs:
+        await insert_chunk(docs, doc_rows, report)
+
+    report["failed"] = len(report["errors"])
+    return report
+
+@router.get("/", response_model=TransactionPage)
+async def get_transactions(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category: Optional[str] = None,
+    stream: bool = False,
+):
+    query = transactions_filter(user_id, start_date, end_date, category, cursor)
+
+    if stream:
+        # Stream every matching transaction as NDJSON without buffering the result
+        mongo_cursor = db.transactions.find(query).sort(SORT_ORDER).batch_size(STREAM_BATCH_SIZE)
+        return StreamingResponse(stream_transactions(mongo_cursor), media_type="application/x-ndjson")
+
+    # Fetch one extra document to know whether another page exists
+    docs = await db.transactions.find(query).sort(SORT_ORDER).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    # Returned as-is: response_model only documents the shape here
+    return FastJSONResponse({"items": [transaction_json(doc) for doc in docs[:limit]], "next_cursor": next_cursor})
 
 @router.get("/{transaction_id}", response_model=Transaction)
 async def get_transaction(transaction_id: str):
-    transaction = db.transactions.find_one({"_id": ObjectId(transaction_id)})
+    transaction = await db.transactions.find_one({"_id": ObjectId(transaction_id)})
     if transaction:
-        transaction["id"] = str(transaction["_id"])
-        return transaction
-    raise HTTPException(status_code=404, detail="Transaction not found")
\ No newline at end of file
+        return FastJSONResponse(transaction_json(transaction))
+    raise HTTPException(status_code=404, detail="Transaction not found")
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends
 from app.models import User, UserCreate
-from app.auth import get_password_hash, verify_password, create_access_token
+from app.auth import create_access_token, password_hasher, PasswordHasherBusy
 from app.db import db
+from app.auth_utils import token_cache
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -14,34 +16,56 @@ class LoginRequest(BaseModel):
 @router.post("/register")
 async def register(user: UserCreate):
     # Check if user exists
-    if db.users.find_one({"email": user.email}):
+    if await db.users.find_one({"email": user.email}):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     user_dict = user.dict()
     user_dict["password"] = hashed_password
     user_dict["_id"] = ObjectId()
     
-    db.users.insert_one(user_dict)
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration for the same email
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     return {"message": "User registered successfully"}
 
 @router.post("/login")
 async def login(login_data: LoginRequest):
+    user = await db.users.find_one({"email": login_data.email})
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
     try:
-        user = db.users.find_one({"email": login_data.email})
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid email or password")
-        
-        if not verify_password(login_data.password, user["password"]):
-            raise HTTPException(status_code=401, detail="Invalid email or password")
-        
-        access_token = create_access_token(data={"sub": str(user["_id"])})
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "user_id": str(user["_id"])
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        valid, new_hash = await password_hasher.verify_and_update(login_data.password, user["password"])
+    except PasswordHasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
+    if new_hash:
+        # Stored with a different BCRYPT_ROUNDS; upgrade while we have the plain password
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+    
+    access_token = create_access_token(data={"sub": str(user["_id"])})
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user_id": str(user["_id"])
+    }
+
+@router.get("/token-cache-stats")
+async def get_token_cache_stats():
+    """Hit ratio and saved lookup time of the authenticated-user cache (per worker)."""
+    return token_cache.stats()
+
+@router.get("/password-hasher-stats")
+async def get_password_hasher_stats():
+    """Queued/running hash operations and requests refused with 503 (per worker)."""
+    return password_hasher.stats()
@@ -0,0 +1,371 @@
+"""End-to-end latency benchmark for every API router.
+
+Seeds a dedicated database with app.ml.generate_dataset, boots
+`uvicorn app.main:app` against it, then drives each route below at a fixed
+concurrency and records throughput and p50/p95/p99 latency:
+
+    users         login
+    transactions  list page, get one, create one, bulk insert
+    insights      spending by category, monthly trend
+    ml            predict category (single and batch), predict next month
+
+Results are written as JSON. Given --baseline, each route is compared with an
+earlier run and the script exits non-zero if p99 or throughput regressed by
+more than --tolerance, so it can gate a deploy.
+
+MongoDB comes from --mongodb-uri (a local mongod by default), or with
+--in-memory from a throwaway mongod started by the `pymongo_inmemory`
+package. Either way the benchmark uses its own database, --db-name.
+
+    python benchmarks/api_latency.py --users 200 --output results.json
+    python benchmarks/api_latency.py --users 200 --baseline results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = "password123"
+EMAIL_PREFIX = "bench"
+CATEGORIES = ['Food', 'Travel', 'Shopping', 'Entertainment', 'Bills']
+
+
+def percentile(ordered, fraction):
+    return ordered[max(0, int(len(ordered) * fraction + 0.5) - 1)] * 1000
+
+
+# --- Route scenarios -------------------------------------------------------
+# Each returns the keyword arguments of one httpx request for a random user.
+
+def login(user, rng):
+    return {"method": "POST", "url": "/api/users/login", "json": {"email": user["email"], "password": PASSWORD}}
+
+
+def list_transactions(user, rng):
+    return {"method": "GET", "url": "/api/transactions/", "params": {"user_id": user["id"], "limit": 50}}
+
+
+def get_transaction(user, rng):
+    return {"method": "GET", "url": f"/api/transactions/{rng.choice(user['transaction_ids'])}"}
+
+
+def make_row(user, rng):
+    return {
+        "user_id": user["id"],
+        "amount": round(-rng.uniform(100, 5000), 2),
+        "category": rng.choice(CATEGORIES),
+        "description": "Benchmark row",
+        "date": datetime.now().isoformat(),
+    }
+
+
+def create_transaction(user, rng):
+    return {"method": "POST", "url": "/api/transactions/", "json": make_row(user, rng)}
+
+
+def bulk_transactions(user, rng):
+    rows = "\n".join(json.dumps(make_row(user, rng)) for _ in range(100))
+    return {
+        "method": "POST",
+        "url": "/api/transactions/bulk",
+        "content": rows,
+        "headers": {"Content-Type": "application/x-ndjson"},
+    }
+
+
+def spending_by_category(user, rng):
+    return {"method": "GET", "url": f"/api/insights/spending-by-category/{user['id']}", "params": {"days": 30}}
+
+
+def monthly_trend(user, rng):
+    return {"method": "GET", "url": f"/api/insights/monthly-trend/{user['id']}", "params": {"months": 6}}
+
+
+def predict_category(user, rng):
+    return {
+        "method": "POST",
+        "url": "/api/ml/predict/category",
+        "json": {"amount": round(rng.uniform(100, 5000), 2)},
+        "headers": user["auth"],
+    }
+
+
+def predict_category_batch(user, rng):
+    return {
+        "method": "POST",
+        "url": "/api/ml/predict/category/batch",
+        "json": {"transactions": [{"amount": round(rng.uniform(100, 5000), 2)} for _ in range(50)]},
+        "headers": user["auth"],
+    }
+
+
+def predict_next_month(user, rng):
+    return {"method": "GET", "url": "/api/ml/predict/next-month", "headers": user["auth"]}
+
+
+SCENARIOS = {
+    "users.login": login,
+    "transactions.list": list_transactions,
+    "transactions.get": get_transaction,
+    "transactions.create": create_transaction,
+    "transactions.bulk": bulk_transactions,
+    "insights.spending_by_category": spending_by_category,
+    "insights.monthly_trend": monthly_trend,
+    "ml.predict_category": predict_category,
+    "ml.predict_category_batch": predict_category_batch,
+    "ml.predict_next_month": predict_next_month,
+}
+
+
+# --- Environment -----------------------------------------------------------
+
+@contextlib.contextmanager
+def mongodb(args):
+    """Yield the MongoDB URI to benchmark against."""
+    if not args.in_memory:
+        yield args.mongodb_uri
+        return
+    try:
+        from pymongo_inmemory import Mongod
+    except ImportError:
+        raise SystemExit("--in-memory requires the 'pymongo_inmemory' package")
+    with Mongod() as mongod:
+        yield mongod.connection_string
+
+
+def seed(env, args):
+    subprocess.run(
+        [
+            sys.executable, "-m", "app.ml.generate_dataset",
+            "--users", str(args.users), "--months", str(args.months),
+            "--transactions-per-month", str(args.transactions_per_month),
+            "--seed", str(args.seed), "--end", args.end, "--email-prefix", EMAIL_PREFIX, "--password", PASSWORD,
+            "--replace", "--rebuild-rollups",
+        ],
+        cwd=BACKEND_DIR, env=env, check=True,
+    )
+
+
+@contextlib.contextmanager
+def server(env, args):
+    """Run uvicorn in a subprocess until the block exits."""
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        deadline = time.monotonic() + 60
+        while True:
+            if process.poll() is not None:
+                raise SystemExit("Server exited during startup")
+            try:
+                if httpx.get(f"{base_url}/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit("Server did not become healthy within 60s")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def prepare_users(client, args):
+    """Log in a sample of the seeded users and make sure their models exist."""
+    users = []
+    for index in random.Random(args.seed).sample(range(args.users), min(args.sample_users, args.users)):
+        email = f"{EMAIL_PREFIX}{index}@example.com"
+        response = await client.post("/api/users/login", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        body = response.json()
+        page = await client.get("/api/transactions/", params={"user_id": body["user_id"], "limit": 100})
+        page.raise_for_status()
+        users.append({
+            "id": body["user_id"],
+            "email": email,
+            "auth": {"Authorization": f"Bearer {body['access_token']}"},
+            "transaction_ids": [t["id"] for t in page.json()["items"]],
+        })
+
+    # Train every sampled user's models up front so predictions hit a loaded model
+    jobs = []
+    for user in users:
+        for path in ("/api/ml/train/category", "/api/ml/train/next-month"):
+            response = await client.post(path, params={"incremental": "false"}, headers=user["auth"])
+            response.raise_for_status()
+            jobs.append((user, response.headers["Location"]))
+    for user, location in jobs:
+        while True:
+            job = (await client.get(location, headers=user["auth"])).json()
+            if job["status"] == "failed":
+                raise SystemExit(f"Training failed for user {user['id']}: {job['error']}")
+            if job["status"] == "succeeded":
+                break
+            await asyncio.sleep(0.5)
+    return users
+
+
+# --- Measurement -----------------------------------------------------------
+
+async def run_scenario(client, scenario, users, args):
+    """Send args.requests requests with args.concurrency in flight."""
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    errors = 0
+
+    async def one_request():
+        nonlocal errors
+        request = scenario(rng.choice(users), rng)
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(**request)
+            latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400 or response.status_code == 202:
+            errors += 1  # 202 means the model was not loaded: not the path being measured
+
+    # Warm up connections and caches before timing
+    await asyncio.gather(*(one_request() for _ in range(min(args.concurrency, args.requests))))
+    latencies.clear()
+    errors = 0
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "requests_per_sec": round(args.requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return (route, metric, baseline, current) for every regression."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append((name, "p99_ms", before["p99_ms"], current["p99_ms"]))
+        if current["requests_per_sec"] < before["requests_per_sec"] * (1 - tolerance):
+            regressions.append((name, "requests_per_sec", before["requests_per_sec"], current["requests_per_sec"]))
+        if current["errors"] > before["errors"]:
+            regressions.append((name, "errors", before["errors"], current["errors"]))
+    return regressions
+
+
+async def benchmark(base_url, args):
+    names = [name for name in SCENARIOS if not args.routes or any(name.startswith(r) for r in args.routes)]
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        users = await prepare_users(client, args)
+        results = {}
+        print(f"{'route':<32} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'errors':>8}")
+        for name in names:
+            result = await run_scenario(client, SCENARIOS[name], users, args)
+            results[name] = result
+            print(
+                f"{name:<32} {result['requests_per_sec']:>10.1f} {result['p50_ms']:>10.1f} "
+                f"{result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} {result['errors']:>8}"
+            )
+    return results
+
+
+def main(args):
+    with mongodb(args) as uri:
+        env = {**os.environ, "MONGODB_URI": uri, "MONGODB_DB_NAME": args.db_name}
+        if not args.skip_seed:
+            seed(env, args)
+        with server(env, args) as base_url:
+            results = asyncio.run(benchmark(base_url, args))
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            key: getattr(args, key)
+            for key in ("users", "months", "transactions_per_month", "seed", "end", "concurrency", "requests", "workers")
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != report["config"]:
+            print("\nWarning: baseline was recorded with a different configuration")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for name, metric, before, current in regressions:
+            print(f"REGRESSION {name} {metric}: {before} -> {current}")
+        print(f"\n{len(regressions)} regression(s) against {args.baseline} (tolerance {args.tolerance:.0%})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark latency of every API route against a seeded database')
+    parser.add_argument('--mongodb-uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'),
+                      help='MongoDB to benchmark against (default: $MONGODB_URI or localhost)')
+    parser.add_argument('--in-memory', action='store_true',
+                      help='Start a throwaway in-memory mongod instead (needs pymongo_inmemory)')
+    parser.add_argument('--db-name', default='finance_bench',
+                      help='Database the benchmark seeds and uses (default: finance_bench)')
+    parser.add_argument('--users', type=int, default=200,
+                      help='Users to seed (default: 200)')
+    parser.add_argument('--months', type=int, default=24,
+                      help='Months of history per user (default: 24)')
+    parser.add_argument('--transactions-per-month', type=float, default=30,
+                      help='Average transactions per user and month (default: 30)')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Dataset and request-mix seed (default: 0)')
+    parser.add_argument('--end', default=date.today().isoformat(),
+                      help='Last day of the seeded history, YYYY-MM-DD (default: today)')
+    parser.add_argument('--skip-seed', action='store_true',
+                      help='Reuse the data from a previous run with the same settings')
+    parser.add_argument('--sample-users', type=int, default=20,
+                      help='Seeded users whose requests are replayed (default: 20)')
+    parser.add_argument('--routes', nargs='+',
+                      help='Only run routes starting with these names, e.g. insights ml.predict_category')
+    parser.add_argument('--concurrency', type=int, default=16,
+                      help='Requests in flight (default: 16)')
+    parser.add_argument('--requests', type=int, default=500,
+                      help='Requests per route (default: 500)')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='uvicorn worker processes (default: 1)')
+    parser.add_argument('--port', type=int, default=8099,
+                      help='Port for the benchmarked server (default: 8099)')
+    parser.add_argument('--output',
+                      help='Write results as JSON to this file')
+    parser.add_argument('--baseline',
+                      help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                      help='Allowed relative slowdown before a route counts as regressed (default: 0.2)')
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+"""Compare rows/sec of the bulk ingest endpoint against one POST per transaction.
+
+Run against a live server, e.g.:
+
+    uvicorn app.main:app
+    python benchmarks/bulk_ingest.py --rows 5000
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+CATEGORIES = ['Food', 'Rent', 'Travel', 'Shopping', 'Entertainment', 'Bills', 'Salary']
+
+
+def make_rows(user_id, count):
+    now = datetime.now()
+    return [
+        {
+            "user_id": user_id,
+            "amount": round(-random.uniform(100, 5000), 2),
+            "category": random.choice(CATEGORIES),
+            "description": f"Benchmark row {i}",
+            "date": (now - timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+async def single_inserts(client, rows, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(row):
+        async with semaphore:
+            response = await client.post("/api/transactions/", json=row)
+            response.raise_for_status()
+
+    await asyncio.gather(*(post(row) for row in rows))
+
+
+async def bulk_insert(client, rows, fmt):
+    if fmt == "json":
+        content, content_type = json.dumps(rows), "application/json"
+    elif fmt == "ndjson":
+        content = "\n".join(json.dumps(row) for row in rows)
+        content_type = "application/x-ndjson"
+    else:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+        content, content_type = buffer.getvalue(), "text/csv"
+
+    response = await client.post(
+        "/api/transactions/bulk", content=content, headers={"Content-Type": content_type}
+    )
+    response.raise_for_status()
+    report = response.json()
+    if report["failed"]:
+        raise RuntimeError(f"Bulk insert reported errors: {report['errors'][:5]}")
+
+
+async def timed(label, rows, coro):
+    start = time.perf_counter()
+    await coro
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {len(rows):>8} rows {elapsed:>8.2f}s {len(rows) / elapsed:>10.0f} rows/s")
+
+
+async def main(args):
+    user_id = args.user_id or f"bench-{random.getrandbits(32):08x}"
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=600) as client:
+        rows = make_rows(user_id, args.single_rows)
+        await timed(f"single (x{args.concurrency})", rows, single_inserts(client, rows, args.concurrency))
+        for fmt in ("json", "ndjson", "csv"):
+            rows = make_rows(user_id, args.rows)
+            await timed(f"bulk {fmt}", rows, bulk_insert(client, rows, fmt))
+    print(f"\nRows were written for user_id {user_id}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark bulk transaction ingest')
+    parser.add_argument('--base-url', default='http://localhost:8000',
+                      help='Server base URL (default: http://localhost:8000)')
+    parser.add_argument('--user-id', default=None,
+                      help='User to write rows for (default: a fresh bench-* id)')
+    parser.add_argument('--rows', type=int, default=5000,
+                      help='Rows per bulk request (default: 5000)')
+    parser.add_argument('--single-rows', type=int, default=1000,
+                      help='Rows to send through the single-insert path (default: 1000)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                      help='In-flight single inserts (default: 8)')
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""Measure how request throughput scales with the number of in-flight requests.
+
+Run against a live server, e.g.:
+
+    uvicorn app.main:app --workers 1
+    python benchmarks/concurrency.py --user-id <user_id>
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def run_level(client, path, concurrency, total_requests):
+    """Fire `total_requests` requests with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_request():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests_per_sec": total_requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main(args):
+    path = args.path.format(user_id=args.user_id)
+    limits = httpx.Limits(max_connections=max(args.levels))
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        # Warm up the connection pools on both sides
+        await run_level(client, path, 1, 10)
+
+        print(f"{'in-flight':>10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+        for level in args.levels:
+            result = await run_level(client, path, level, args.requests)
+            print(
+                f"{result['concurrency']:>10} {result['requests_per_sec']:>10.1f} "
+                f"{result['p50_ms']:>10.1f} {result['p99_ms']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark throughput against in-flight requests')
+    parser.add_argument('--base-url', default='http://localhost:8000',
+                      help='Server base URL (default: http://localhost:8000)')
+    parser.add_argument('--user-id', required=True,
+                      help='User whose data the benchmarked route reads')
+    parser.add_argument('--path', default='/api/insights/monthly-trend/{user_id}',
+                      help='Route to benchmark; {user_id} is substituted')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64],
+                      help='In-flight request counts to measure')
+    parser.add_argument('--requests', type=int, default=500,
+                      help='Requests per concurrency level (default: 500)')
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,164 @@
+"""Check FlatForest against scikit-learn and compare their latency.
+
+Fits forests shaped like the app's models on synthetic data:
+- a category classifier, also after an incremental warm-start extension
+- a next-month regressor
+It then verifies that the flattened forests give the same per-tree outputs,
+probabilities and predictions as scikit-learn, and times inference both ways
+on a single row, on MAX_ROWS rows (the largest input predict_categories sends
+to the flat forest) and on a larger batch. Exits non-zero on any mismatch.
+
+    python benchmarks/flat_forest.py [--rows 2000] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.ml.flat_forest import MAX_ROWS, FlatForest  # noqa: E402
+
+
+def category_data(rng, rows):
+    """Rows of [abs(amount), month, day, dayofweek] with amount ranges per category."""
+    low = np.array([100, 15000, 500, 500, 200, 1000, 50000])
+    high = np.array([2000, 50000, 5000, 10000, 3000, 8000, 150000])
+    y = rng.integers(0, len(low), rows)
+    X = np.column_stack([
+        rng.uniform(low[y], high[y]).round(2),
+        rng.integers(1, 13, rows),
+        rng.integers(1, 29, rows),
+        rng.integers(0, 7, rows),
+    ]).astype(float)
+    return X, y
+
+
+def regression_data(rng, rows):
+    """Rows of [total, mean, std, count] for one month, target the next month's total."""
+    count = rng.integers(5, 60, rows).astype(float)
+    mean = -rng.uniform(200, 3000, rows)
+    X = np.column_stack([mean * count, mean, -mean * rng.uniform(0.2, 1.5, rows), count])
+    y = X[:, 0] * rng.uniform(0.8, 1.2, rows)
+    return X, y
+
+
+def timed(fn, repeat):
+    """Median seconds per call."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def check_parity(name, model, flat, X):
+    """Return a list of mismatch descriptions."""
+    problems = []
+    outputs = flat.tree_outputs(X)
+    if hasattr(model, "classes_"):
+        expected_trees = np.stack([e.predict_proba(X) for e in model.estimators_], axis=1)
+        if not np.allclose(outputs, expected_trees, rtol=0, atol=1e-12):
+            problems.append(f"{name}: per-tree probabilities differ")
+        proba = flat.predict_proba(X)
+        if not np.allclose(proba, model.predict_proba(X), rtol=0, atol=1e-9):
+            problems.append(f"{name}: predict_proba differs")
+        if not (proba.argmax(axis=1) == model.predict_proba(X).argmax(axis=1)).all():
+            problems.append(f"{name}: predicted classes differ")
+    else:
+        expected_trees = np.stack([e.predict(X) for e in model.estimators_], axis=1)
+        if not np.array_equal(outputs, expected_trees):
+            problems.append(f"{name}: per-tree predictions differ")
+        if not np.allclose(flat.predict(X), model.predict(X), rtol=1e-12, atol=1e-6):
+            problems.append(f"{name}: predict differs")
+        interval = np.percentile(outputs, [2.5, 97.5], axis=1)
+        if not np.array_equal(interval, np.percentile(expected_trees, [2.5, 97.5], axis=1)):
+            problems.append(f"{name}: confidence interval differs")
+    return problems
+
+
+def report(name, model, flat, X, repeat):
+    if hasattr(model, "classes_"):
+        def sk_fn(rows):
+            return lambda: model.predict_proba(rows)
+
+        def flat_fn(rows):
+            return lambda: flat.predict_proba(rows)
+    else:
+        # The old predict_next_month: predict plus a Python loop over estimators for the interval
+        def sk_fn(rows):
+            def run():
+                model.predict(rows)
+                for row in rows:
+                    np.percentile([e.predict(row[None])[0] for e in model.estimators_], [2.5, 97.5])
+            return run if len(rows) == 1 else (lambda: model.predict(rows))
+
+        def flat_fn(rows):
+            def run():
+                outputs = flat.tree_outputs(rows)
+                outputs.mean(axis=1)
+                np.percentile(outputs, [2.5, 97.5], axis=1)
+            return run if len(rows) == 1 else (lambda: flat.predict(rows))
+
+    for size in (1, MAX_ROWS, len(X)):
+        rows = X[:size]
+        sk_time, flat_time = timed(sk_fn(rows), repeat), timed(flat_fn(rows), repeat)
+        label = "1 row" if size == 1 else f"{size} rows"
+        print(
+            f"{name:<24} {label:>10} {sk_time * 1e6:>14.0f} {flat_time * 1e6:>14.0f} "
+            f"{sk_time / flat_time:>9.1f}x"
+        )
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+
+    X, y = category_data(rng, args.rows)
+    classifier = RandomForestClassifier(n_estimators=100, random_state=42).fit(X, y)
+    extended = RandomForestClassifier(n_estimators=100, random_state=42).fit(X, y)
+    X_new, y_new = category_data(rng, args.rows // 10)
+    extended.set_params(warm_start=True, bootstrap=False, n_estimators=110)
+    extended.fit(X_new, y_new)
+
+    X_reg, y_reg = regression_data(rng, 24)
+    regressor = RandomForestRegressor(n_estimators=100, random_state=42).fit(X_reg, y_reg)
+
+    models = [
+        ("category", classifier, category_data),
+        ("category (extended)", extended, category_data),
+        ("next_month", regressor, regression_data),
+    ]
+
+    problems = []
+    print(f"{'model':<24} {'input':>10} {'sklearn us':>14} {'flat us':>14} {'speedup':>10}")
+    for name, model, make_data in models:
+        flat = FlatForest.from_estimator(model)
+        X_test, _ = make_data(rng, args.batch)
+        problems += check_parity(name, model, flat, X_test)
+        report(name, model, flat, X_test, args.repeat)
+
+    if problems:
+        print("\n" + "\n".join(problems))
+        return 1
+    print("\nFlatForest matches scikit-learn on every model")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Parity and latency of FlatForest against scikit-learn')
+    parser.add_argument('--rows', type=int, default=2000,
+                      help='Training rows for the category model (default: 2000)')
+    parser.add_argument('--batch', type=int, default=1000,
+                      help='Rows in the batch-scoring measurement (default: 1000)')
+    parser.add_argument('--repeat', type=int, default=200,
+                      help='Timed calls per measurement (default: 200)')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Random seed (default: 0)')
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""Check that a burst of logins doesn't slow down unrelated routes.
+
+Measures latency of a cheap route (GET /health by default) on its own, then
+again while many concurrent logins keep the password hasher saturated. With
+hashing offloaded to its worker pool, p99 of the probe route should stay flat;
+logins beyond PASSWORD_HASH_MAX_PENDING are answered with 503.
+
+Run against a live server, e.g.:
+
+    uvicorn app.main:app --workers 1
+    python benchmarks/login_storm.py
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[max(0, int(len(ordered) * fraction) - 1)] * 1000
+
+
+async def probe(client, path, stop, latencies, interval):
+    """Request `path` every `interval` seconds until `stop` is set."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+
+async def measure_probe(client, args, load=None):
+    """Probe latencies, optionally while `load` runs; returns (latencies, load result)."""
+    stop = asyncio.Event()
+    latencies = []
+    probe_task = asyncio.create_task(probe(client, args.probe_path, stop, latencies, args.probe_interval))
+    if load is None:
+        await asyncio.sleep(args.duration)
+        result = None
+    else:
+        result = await load
+    stop.set()
+    await probe_task
+    return latencies, result
+
+
+async def login_storm(client, credentials, concurrency, total):
+    """Fire `total` logins with at most `concurrency` in flight; count status codes."""
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+    latencies = []
+
+    async def one_login():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/api/users/login", json=credentials)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(total)))
+    return {"statuses": statuses, "seconds": time.perf_counter() - start, "latencies": latencies}
+
+
+async def main(args):
+    email = args.email or f"storm-{uuid.uuid4().hex[:8]}@example.com"
+    credentials = {"email": email, "password": args.password}
+    limits = httpx.Limits(max_connections=args.concurrency + 8)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=120) as client:
+        if not args.email:
+            response = await client.post(
+                "/api/users/register",
+                json={"email": email, "username": email.split("@")[0], "password": args.password},
+            )
+            response.raise_for_status()
+
+        baseline, _ = await measure_probe(client, args)
+        during, storm = await measure_probe(
+            client, args, login_storm(client, credentials, args.concurrency, args.logins)
+        )
+
+    print(f"{'probe ' + args.probe_path:<24} {'requests':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for label, latencies in (("idle", baseline), ("during login storm", during)):
+        print(f"{label:<24} {len(latencies):>10} {percentile(latencies, 0.5):>10.1f} {percentile(latencies, 0.99):>10.1f}")
+
+    statuses = ", ".join(f"{code}: {count}" for code, count in sorted(storm["statuses"].items()))
+    print(
+        f"\n{args.logins} logins ({args.concurrency} in flight) in {storm['seconds']:.1f}s, "
+        f"login p99 {percentile(storm['latencies'], 0.99):.0f} ms; status codes {statuses}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Probe route latency during a burst of logins')
+    parser.add_argument('--base-url', default='http://localhost:8000',
+                      help='Server base URL (default: http://localhost:8000)')
+    parser.add_argument('--email',
+                      help='Existing account to log in as (default: register a fresh one)')
+    parser.add_argument('--password', default='storm-password',
+                      help='Password of the account')
+    parser.add_argument('--logins', type=int, default=200,
+                      help='Total login attempts (default: 200)')
+    parser.add_argument('--concurrency', type=int, default=50,
+                      help='Logins in flight at once (default: 50)')
+    parser.add_argument('--probe-path', default='/health',
+                      help='Unrelated route whose latency is measured (default: /health)')
+    parser.add_argument('--probe-interval', type=float, default=0.01,
+                      help='Seconds between probe requests (default: 0.01)')
+    parser.add_argument('--duration', type=float, default=5,
+                      help='Seconds to measure the idle baseline (default: 5)')
+
+    asyncio.run(main(parser.parse_args()))
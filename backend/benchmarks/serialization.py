@@ -0,0 +1,285 @@
+"""CPU per request and bytes on the wire for the large JSON routes.
+
+Two parts:
+
+1. Rendering only (no database): one page of --page-size transactions
+   rendered the way FastAPI does it with a response_model (validate, dump,
+   stdlib json) and the trusted way (transaction_json, then the json or
+   orjson renderer), plus the page's size with each Content-Encoding.
+
+2. End to end (unless --render-only): get_transactions (a page and the full
+   NDJSON stream) and the insights routes, called in-process over ASGI
+   against a database seeded by app.ml.generate_dataset. Each renderer runs
+   in its own child process, since JSON_RENDERER is read at import, and
+   requests each route with every Accept-Encoding. CPU is process time per
+   request, which also includes the MongoDB driver's decoding.
+
+Part 1 needs `orjson` for its orjson rows and `brotli` for br; both parts
+skip what is not installed.
+
+    python benchmarks/serialization.py [--users 5] [--render-only]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+EMAIL_PREFIX = "serialization"
+PASSWORD = "password123"
+
+
+def installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def renderers():
+    return ["json"] + (["orjson"] if installed("orjson") else [])
+
+
+def encodings():
+    return ["identity", "gzip"] + (["br"] if installed("brotli") else [])
+
+
+def cpu_per_call(fn, repeat):
+    """Median process time per call, in microseconds."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        samples.append(time.process_time() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1e6
+
+
+def encoded_size(body, encoding):
+    from app.responses import COMPRESSORS
+
+    if encoding == "identity":
+        return len(body)
+    compressor = COMPRESSORS[encoding]()
+    return len(compressor.compress(body) + compressor.finish())
+
+
+# --- Part 1: rendering only -------------------------------------------------
+
+def sample_docs(count):
+    from bson import ObjectId
+
+    start = datetime(2024, 1, 1, 9, 30)
+    categories = ["Food", "Bills", "Travel", "Shopping", "Entertainment"]
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": "6520f0c2a1b2c3d4e5f60718",
+            "amount": -round(100 + (i * 37.31) % 4900, 2),
+            "category": categories[i % len(categories)],
+            "description": f"Purchase #{i} at Local Store",
+            "date": start - timedelta(hours=7 * i, microseconds=1000 * (i % 7)),
+        }
+        for i in range(count)
+    ]
+
+
+def render_only(args):
+    from starlette.responses import JSONResponse
+
+    from app.models import TransactionPage
+    from app.responses import create_dumps
+    from app.routes.transactions import transaction_json
+
+    docs = sample_docs(args.page_size)
+
+    def validated():
+        # What FastAPI does with response_model=TransactionPage and a plain return value
+        items = [{**doc, "id": str(doc["_id"])} for doc in docs]
+        page = TransactionPage.model_validate({"items": items, "next_cursor": None})
+        return JSONResponse(page.model_dump(mode="json")).body
+
+    paths = {"response_model + json": validated}
+    for name in renderers():
+        dumps = create_dumps(name)
+        paths[f"trusted + {name}"] = lambda dumps=dumps: dumps(
+            {"items": [transaction_json(doc) for doc in docs], "next_cursor": None}
+        )
+
+    expected = json.loads(validated())
+    print(f"Rendering a page of {args.page_size} transactions\n")
+    print(f"{'path':<24} {'cpu us':>10} " + " ".join(f"{e + ' B':>12}" for e in encodings()))
+    for name, render in paths.items():
+        body = render()
+        if json.loads(body) != expected:
+            raise SystemExit(f"{name} renders a different document")
+        sizes = " ".join(f"{encoded_size(body, e):>12}" for e in encodings())
+        print(f"{name:<24} {cpu_per_call(render, args.repeat):>10.0f} {sizes}")
+
+
+# --- Part 2: end to end -----------------------------------------------------
+
+async def call(app, path, params=None, headers=None):
+    """One GET through the ASGI app; returns (status, response headers, raw body bytes)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(params or {}).encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    messages = []
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        # The request body once, then block like a connected client would
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_done.set()
+
+    await app(scope, receive, send)
+    start = messages[0]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], dict(start["headers"]), body
+
+
+def route_requests(user_id, token):
+    auth = {"Authorization": f"Bearer {token}"}
+    return {
+        "transactions page (500)": ("/api/transactions/", {"user_id": user_id, "limit": 500}, {}),
+        "transactions stream": ("/api/transactions/", {"user_id": user_id, "stream": "true"}, {}),
+        "spending-by-category": (f"/api/insights/spending-by-category/{user_id}", {"days": 365}, {}),
+        "monthly-trend": (f"/api/insights/monthly-trend/{user_id}", {"months": 24}, {}),
+        "summary": ("/api/insights/summary", {"days": 365, "months": 24, "recent": 100}, auth),
+    }
+
+
+async def child_benchmark(args):
+    from pymongo import MongoClient
+
+    from app.auth import create_access_token
+    from app.main import app
+
+    client = MongoClient(os.environ["MONGODB_URI"])
+    user = client[os.environ["MONGODB_DB_NAME"]].users.find_one({"email": f"{EMAIL_PREFIX}0@example.com"})
+    client.close()
+    user_id = str(user["_id"])
+    token = create_access_token(data={"sub": user_id})
+
+    results = []
+    for route, (path, params, headers) in route_requests(user_id, token).items():
+        for encoding in encodings():
+            request_headers = {**headers, "Accept-Encoding": encoding}
+            status, _, body = await call(app, path, params, request_headers)
+            if status != 200:
+                raise SystemExit(f"{route} answered {status}: {body[:200]!r}")
+            samples = []
+            for _ in range(args.requests):
+                start = time.process_time()
+                await call(app, path, params, request_headers)
+                samples.append(time.process_time() - start)
+            samples.sort()
+            results.append({
+                "route": route,
+                "encoding": encoding,
+                "cpu_ms": round(samples[len(samples) // 2] * 1000, 3),
+                "bytes": len(body),
+            })
+    print(json.dumps(results))
+
+
+def end_to_end(args):
+    env = {
+        **os.environ,
+        "MONGODB_URI": args.mongodb_uri,
+        "MONGODB_DB_NAME": args.db_name,
+        "SECRET_KEY": os.getenv("SECRET_KEY", "serialization-benchmark"),
+        # Measure the same work on every request, and keep model training out of it
+        "INSIGHTS_CACHE_BACKEND": "none",
+        "ML_TRAINING_MAX_PENDING": "0",
+        "COMPRESSION_ENCODINGS": ",".join(e for e in encodings() if e != "identity"),
+    }
+    if not args.skip_seed:
+        subprocess.run(
+            [
+                sys.executable, "-m", "app.ml.generate_dataset",
+                "--users", str(args.users), "--months", str(args.months),
+                "--transactions-per-month", str(args.transactions_per_month),
+                "--email-prefix", EMAIL_PREFIX, "--password", PASSWORD,
+                "--replace", "--rebuild-rollups",
+            ],
+            cwd=BACKEND_DIR, env=env, check=True,
+        )
+
+    rows = {}
+    for renderer in renderers():
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--requests", str(args.requests)],
+            cwd=BACKEND_DIR, env={**env, "JSON_RENDERER": renderer}, check=True, capture_output=True, text=True,
+        ).stdout
+        for result in json.loads(output.strip().splitlines()[-1]):
+            rows.setdefault((result["route"], result["encoding"]), {})[renderer] = result
+
+    print(f"\nEnd to end, median CPU per request ({args.requests} requests)\n")
+    print(f"{'route':<26} {'encoding':<9} " + " ".join(f"{r + ' ms':>10}" for r in renderers()) + f" {'bytes':>10}")
+    for (route, encoding), by_renderer in rows.items():
+        cpu = " ".join(f"{by_renderer[r]['cpu_ms']:>10.2f}" for r in renderers())
+        print(f"{route:<26} {encoding:<9} {cpu} {by_renderer['json']['bytes']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='CPU and response size of the large JSON routes')
+    parser.add_argument('--mongodb-uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'),
+                      help='MongoDB to benchmark against (default: $MONGODB_URI or localhost)')
+    parser.add_argument('--db-name', default='finance_bench',
+                      help='Database the benchmark seeds and uses (default: finance_bench)')
+    parser.add_argument('--users', type=int, default=5,
+                      help='Users to seed; the first one is measured (default: 5)')
+    parser.add_argument('--months', type=int, default=24,
+                      help='Months of history per user (default: 24)')
+    parser.add_argument('--transactions-per-month', type=float, default=100,
+                      help='Average transactions per user and month (default: 100)')
+    parser.add_argument('--skip-seed', action='store_true',
+                      help='Reuse the data from a previous run with the same settings')
+    parser.add_argument('--page-size', type=int, default=500,
+                      help='Transactions in the rendering-only page (default: 500)')
+    parser.add_argument('--repeat', type=int, default=200,
+                      help='Renders per rendering-only measurement (default: 200)')
+    parser.add_argument('--requests', type=int, default=50,
+                      help='Requests per route and encoding end to end (default: 50)')
+    parser.add_argument('--render-only', action='store_true',
+                      help='Skip the end-to-end part, which needs MongoDB')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child_benchmark(args))
+        sys.exit(0)
+    render_only(args)
+    if not args.render_only:
+        end_to_end(args)
@@ -0,0 +1,69 @@
+"""Measure the import cost of the API with `python -X importtime`.
+
+Reports the cumulative import time of app.main and its heaviest modules, and
+fails if any ML dependency is imported at startup, since /health and the
+non-ML routes should not pay for it.
+
+    python benchmarks/startup.py [--runs 5]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on the first ML request (or by ML_PREWARM), never at import time
+LAZY_MODULES = ("numpy", "pandas", "sklearn", "joblib", "scipy")
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(module):
+    """Run one fresh interpreter and return {module: (self_us, cumulative_us)}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            profile[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return profile
+
+
+def main(args):
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+    totals = [p[args.module][1] / 1000 for p in profiles]
+    print(f"import {args.module}: median {statistics.median(totals):.1f} ms "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}) over {args.runs} runs")
+
+    last = profiles[-1]
+    print("\nHeaviest modules by self time:")
+    for name, (self_us, _) in sorted(last.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_us / 1000:>8.1f} ms  {name}")
+
+    eager = sorted(name for name in last if name.split(".")[0] in LAZY_MODULES)
+    if eager:
+        print(f"\nML modules imported at startup: {', '.join(eager[:10])}")
+        return 1
+    print("\nNo ML modules imported at startup")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Profile API import time')
+    parser.add_argument('--module', default='app.main',
+                      help='Module to import (default: app.main)')
+    parser.add_argument('--runs', type=int, default=5,
+                      help='Fresh interpreters to average over (default: 5)')
+    parser.add_argument('--top', type=int, default=15,
+                      help='Heaviest modules to list (default: 15)')
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,159 @@
+"""Peak memory and wall time of the category model's training read.
+
+For users with 10k, 100k and 1M transactions, compares:
+- the old read: list(find()) of full documents, then a DataFrame built from
+  the list of dicts
+- the columnar read: find_columns (projected fields, raw BSON batches into
+  NumPy arrays), then prepare_data
+
+Each path ends with the same feature matrix and encoded labels, and the
+script checks they are equal. Wall time is the median of --repeat runs.
+Peak memory is the largest traced allocation during a separate run, under
+tracemalloc, which sees both Python objects and NumPy buffers.
+
+The benchmark users are seeded into their own database, --db-name, on the
+first run and reused afterwards.
+
+    python benchmarks/training_reads.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from sklearn.preprocessing import LabelEncoder
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.ml.categories import CATEGORIES  # noqa: E402
+from app.ml.columns import find_columns  # noqa: E402
+from app.ml.train_category import FEATURES, prepare_data  # noqa: E402
+
+INSERT_CHUNK = 50000
+
+
+@contextlib.contextmanager
+def mongodb(args):
+    """Yield the MongoDB URI to benchmark against."""
+    if not args.in_memory:
+        yield args.mongodb_uri
+        return
+    try:
+        from pymongo_inmemory import Mongod
+    except ImportError:
+        raise SystemExit("--in-memory requires the 'pymongo_inmemory' package")
+    with Mongod() as mongod:
+        yield mongod.connection_string
+
+
+def seed(collection, user_id, rows, rng):
+    if collection.count_documents({"user_id": user_id}) == rows:
+        return
+    collection.delete_many({"user_id": user_id})
+    start = datetime(2020, 1, 1)
+    for offset in range(0, rows, INSERT_CHUNK):
+        n = min(INSERT_CHUNK, rows - offset)
+        minutes = rng.integers(0, 5 * 365 * 24 * 60, n)
+        categories = rng.choice(list(CATEGORIES), n)
+        amounts = -rng.uniform(10, 10000, n).round(2)
+        collection.insert_many([
+            {
+                "user_id": user_id,
+                "amount": float(amount),
+                "category": str(category),
+                "description": f"Benchmark {category} purchase",
+                "date": start + timedelta(minutes=int(minute)),
+            }
+            for amount, category, minute in zip(amounts, categories, minutes)
+        ], ordered=False)
+
+
+def document_read(collection, user_id):
+    """The training read before columns.py, as it was in train_category."""
+    transactions = list(collection.find({"user_id": user_id}))
+    df = pd.DataFrame(transactions)
+    df['date'] = pd.to_datetime(df['date'])
+    df['month'] = df['date'].dt.month
+    df['day'] = df['date'].dt.day
+    df['dayofweek'] = df['date'].dt.dayofweek
+    df['amount'] = df['amount'].abs()
+    y = LabelEncoder().fit_transform(df['category'])
+    watermark = max(t['_id'] for t in transactions)
+    return df[FEATURES].values, y, watermark
+
+
+def columnar_read(collection, user_id):
+    columns, watermark = find_columns(collection, {"user_id": user_id})
+    df, _ = prepare_data(columns)
+    return df[FEATURES].values, df['category_encoded'].values, watermark
+
+
+def measure(read, repeat):
+    """(median seconds, peak traced bytes, result)."""
+    result = read()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read()
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(samples)), peak, result
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    with mongodb(args) as uri:
+        client = MongoClient(uri)
+        collection = client[args.db_name].transactions
+        collection.create_index(
+            [("user_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], name="user_date_id"
+        )
+
+        problems = []
+        print(f"{'rows':>9} {'read':<10} {'seconds':>9} {'peak MB':>9}")
+        for rows in args.sizes:
+            user_id = f"training-reads-{rows}"
+            seed(collection, user_id, rows, rng)
+            results = {}
+            for name, read in (("documents", document_read), ("columns", columnar_read)):
+                seconds, peak, results[name] = measure(lambda: read(collection, user_id), args.repeat)
+                print(f"{rows:>9} {name:<10} {seconds:>9.3f} {peak / 1e6:>9.1f}")
+
+            (X_docs, y_docs, w_docs), (X_cols, y_cols, w_cols) = results["documents"], results["columns"]
+            if not (np.array_equal(X_docs, X_cols) and np.array_equal(y_docs, y_cols) and w_docs == w_cols):
+                problems.append(f"{rows} rows: columnar read differs from the document read")
+        client.close()
+
+    if problems:
+        print("\n" + "\n".join(problems))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Memory and time of training reads, documents vs columns')
+    parser.add_argument('--mongodb-uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'),
+                      help='MongoDB to benchmark against (default: $MONGODB_URI or localhost)')
+    parser.add_argument('--in-memory', action='store_true',
+                      help='Start a throwaway in-memory mongod instead (needs pymongo_inmemory)')
+    parser.add_argument('--db-name', default='finance_bench',
+                      help='Database holding the benchmark users (default: finance_bench)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                      help='Transactions per benchmark user (default: 10000 100000 1000000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                      help='Timed runs per read (default: 3)')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Random seed for the seeded transactions (default: 0)')
+
+    sys.exit(main(parser.parse_args()))
@@ -24,6 +24,11 @@ const CategoryPrediction = ({ amount, onCategorySelect }) => {
             }
             
             const data = await predictCategory(Math.abs(numAmount));
+            if (data.message === 'model warming') {
+                setPredictions(null);
+                setError('Your category model is being trained. Suggestions will appear shortly.');
+                return;
+            }
             setPredictions(data);
         } catch (err) {
             let errorMessage = 'Error getting prediction';
@@ -11,6 +11,11 @@ const NextMonthPrediction = () => {
             setLoading(true);
             setError(null);
             const data = await predictNextMonth();
+            if (data.message === 'model warming') {
+                setPrediction(null);
+                setError('Your prediction model is being trained. Please try again in a moment.');
+                return;
+            }
             setPrediction(data);
         } catch (err) {
             setError(err.response?.data?.detail || 'Error getting prediction');
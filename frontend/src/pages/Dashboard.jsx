@@ -58,7 +58,7 @@ const Dashboard = () => {
         getMonthlyTrend(userId)
       ]);
 
-      setTransactions(transactionsData);
+      setTransactions(transactionsData.items);
       setCategoryData(categoryStats);
       setTrendData(monthlyTrend);
     } catch (error) {
@@ -228,7 +228,7 @@ const Dashboard = () => {
                 </tr>
               </thead>
               <tbody>
-                {[...transactions].reverse().map((transaction) => (
+                {transactions.map((transaction) => (
                   <tr 
                     key={transaction.id}
                     className="hover:bg-cyan-400/5 transition-colors duration-200"
@@ -31,8 +31,10 @@ export const login = async (email, password) => {
   return response.data;
 };
 
-export const getTransactions = async (userId) => {
-  const response = await api.get(`/transactions?user_id=${userId}`);
+export const getTransactions = async (userId, { limit = 50, cursor = null } = {}) => {
+  const params = { user_id: userId, limit };
+  if (cursor) params.cursor = cursor;
+  const response = await api.get('/transactions', { params });
   return response.data;
 };
 